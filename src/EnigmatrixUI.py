@@ -8,6 +8,8 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtGui import QIcon, QTextCursor, QKeySequence, QKeyEvent
 from PyQt6.QtCore import Qt, QTimer, QThreadPool, QEvent, QCoreApplication
 import key_utils
+import backends
+import subkey_cache
 from utils import (
     load_config, dump_config, save_command, load_command_history,
     get_rsa_files, save_rsa_directory
@@ -559,6 +561,7 @@ class EnigmatrixApp(QMainWindow):
         pref = config.get("preferences")
         window = pref.get("window_mode")
         ui = pref.get("ui_mode")
+        subkey_cache.shared_cache.set_budget(pref.get("subkey_cache_mb", SUBKEY_CACHE_BUDGET // (1024 * 1024)) * 1024 * 1024)
         if window=="fullscreen":
             self.showFullScreen()
         elif window=="maximize":
@@ -586,6 +589,12 @@ class EnigmatrixApp(QMainWindow):
             "rsa_directory" : None,
             "preferences" : {
                 "cores" : utils.get_default_core_count(),
+                "executor" : "thread",
+                "engine" : backends.DEFAULT_BACKEND,
+                "subkey_engine" : "sha512-chain",
+                "subkey_cache_mb" : SUBKEY_CACHE_BUDGET // (1024 * 1024),
+                "queue_depth" : PIPELINE_QUEUE_DEPTH,
+                "direct_io" : False,
                 "window_mode" : "normal",
                 "ui_mode" : "gui",
             },
@@ -698,6 +707,11 @@ class EnigmatrixApp(QMainWindow):
         pref = config.get("preferences")
         benchmarks = config.get("benchmarks")
         cores = pref.get("cores")
+        executor = pref.get("executor", "thread")
+        queue_depth = pref.get("queue_depth", PIPELINE_QUEUE_DEPTH)
+        direct_io = pref.get("direct_io", False)
+        engine = pref.get("engine", backends.DEFAULT_BACKEND)
+        subkey_engine = key_utils.subkey_engine_id(pref.get("subkey_engine", "sha512-chain"))
         rsa_dir = config.get('rsa_directory')
         if not self.input_path:
             return QMessageBox.information(self,"Error","Select a file first!")
@@ -737,7 +751,7 @@ class EnigmatrixApp(QMainWindow):
                 # Disable buttons here
                 self.start_progress_bar()
                 public_key = key_utils.load_rsa_key(os.path.join(rsa_dir,self.rsa_file))
-                cb_args = (self.input_path,self.output_path,raw_key,public_key,cores)
+                cb_args = (self.input_path,self.output_path,raw_key,public_key,cores,executor,engine,subkey_engine,queue_depth,direct_io)
                 worker = ParallelWorker(lambda signals: self.worker_wrapper(signals, encryptor.encrypt_file, cb_args))
                 self.connect_worker_signals(worker,self.on_encrypted)
                 self.threadpool.start(worker)
@@ -759,7 +773,7 @@ class EnigmatrixApp(QMainWindow):
                 return
             # Disable buttons here
             self.start_progress_bar()
-            cb_args = (self.input_path,self.output_path,raw_key,None,cores)
+            cb_args = (self.input_path,self.output_path,raw_key,None,cores,executor,engine,subkey_engine,queue_depth,direct_io)
             worker = ParallelWorker(lambda signals: self.worker_wrapper(signals, encryptor.encrypt_file, cb_args))
             self.connect_worker_signals(worker,self.on_encrypted)
             self.threadpool.start(worker)
@@ -776,6 +790,10 @@ class EnigmatrixApp(QMainWindow):
         pref = config.get("preferences")
         benchmarks = config.get("benchmarks")
         cores = pref.get("cores")
+        executor = pref.get("executor", "thread")
+        queue_depth = pref.get("queue_depth", PIPELINE_QUEUE_DEPTH)
+        direct_io = pref.get("direct_io", False)
+        engine = pref.get("engine", backends.DEFAULT_BACKEND)
         rsa_dir = config.get('rsa_directory')
         if not self.input_path:
             return QMessageBox.information(self,"Error","Select a file first!")
@@ -823,7 +841,7 @@ class EnigmatrixApp(QMainWindow):
                     # Disable buttons here
                     priv_key = key_utils.load_rsa_key(os.path.join(rsa_dir,self.rsa_file))
                     self.start_progress_bar()
-                    cb_args = (self.input_path, self.output_path, None, priv_key, cores)
+                    cb_args = (self.input_path, self.output_path, None, priv_key, cores, executor, engine, queue_depth, direct_io)
                     worker = ParallelWorker(lambda signals: self.worker_wrapper(signals, encryptor.decrypt_file, cb_args))
                     self.connect_worker_signals(worker,self.on_decrypted)
                     self.threadpool.start(worker)
@@ -844,7 +862,7 @@ class EnigmatrixApp(QMainWindow):
                 return
             # Disable buttons here
             self.start_progress_bar()
-            cb_args = (self.input_path, self.output_path, raw_key, None, cores)
+            cb_args = (self.input_path, self.output_path, raw_key, None, cores, executor, engine, queue_depth, direct_io)
             worker = ParallelWorker(lambda signals: self.worker_wrapper(signals, encryptor.decrypt_file, cb_args))
             self.connect_worker_signals(worker,self.on_decrypted)
             self.threadpool.start(worker)
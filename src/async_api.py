@@ -0,0 +1,166 @@
+"""
+asyncio API for encryption and decryption jobs.
+Jobs run as batches on a shared thread pool: every batch is read, transformed and
+written at its own offset by one pool thread, while the event loop only schedules
+batches and reports progress. Many jobs can share one loop without a thread per job.
+
+    progress = async_api.Progress()
+    task = asyncio.create_task(async_api.encrypt_file(src, dst, key, progress=progress))
+    async for processed_blocks, num_blocks in progress:
+        ...
+    await task
+
+Cancelling the task stops scheduling new batches, waits for the running ones and
+closes the files. The partial output file is left for the caller to remove.
+"""
+import asyncio
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+import utils
+import key_utils
+import backends
+import encryptor
+from cfg import *
+
+# Pool shared by all jobs that do not pass their own executor, created on first use
+_default_executor = None
+
+
+def default_executor():
+    global _default_executor
+    if _default_executor is None:
+        _default_executor = ThreadPoolExecutor(max_workers=utils.get_default_core_count(),
+                                               thread_name_prefix="enigmatrix-async")
+    return _default_executor
+
+
+class Progress:
+    """Async iterator of `(processed_blocks, num_blocks)` updates for one job, ending with the job."""
+    def __init__(self):
+        self.queue = asyncio.Queue()
+
+    def update(self, processed_blocks, num_blocks):
+        self.queue.put_nowait((processed_blocks, num_blocks))
+
+    def close(self):
+        self.queue.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self.queue.get()
+        if item is None:
+            raise StopAsyncIteration
+        return item
+
+
+async def encrypt_file(input_path, output_path, raw_key, public_key=None, cores=None, engine=None,
+                       subkey_engine=DEFAULT_SUBKEY_ENGINE, direct_io=False, progress=None, executor=None):
+    """
+    Encrypts a file without blocking the event loop. `cores` is the number of batches in flight.
+    Runs on `executor`, or a pool shared by all async jobs.
+    """
+    loop = asyncio.get_running_loop()
+    executor = executor or default_executor()
+    backend = backends.get_backend(engine)
+
+    def setup():
+        rsa_enc_key = key_utils.rsa_encrypt_key(raw_key, public_key) if public_key else None
+        _, num_blocks, _, header_size = encryptor.prepare_encryption(input_path, output_path, rsa_enc_key, subkey_engine)
+        blocks, writer = encryptor.open_encryption_files(input_path, output_path, header_size, direct_io)
+        compute, write = encryptor.block_stages(get_plan(raw_key, subkey_engine), writer, False, backend, num_blocks)
+        return blocks, writer, compute, write
+
+    await run_job(loop, executor, setup, cores, progress)
+
+
+async def decrypt_file(input_path, output_path, raw_key=None, private_key=None, cores=None, engine=None,
+                       direct_io=False, progress=None, executor=None):
+    """
+    Decrypts a file without blocking the event loop. `cores` is the number of batches in flight.
+    Runs on `executor`, or a pool shared by all async jobs.
+    """
+    loop = asyncio.get_running_loop()
+    executor = executor or default_executor()
+    backend = backends.get_backend(engine)
+
+    def setup():
+        header = utils.read_header(input_path)
+        file_key = encryptor.header_key(header, raw_key, private_key)
+        _, num_blocks = encryptor.prepare_decryption(input_path, output_path, header)
+        blocks, writer = encryptor.open_decryption_files(input_path, output_path, header, direct_io)
+        compute, write = encryptor.block_stages(get_plan(file_key, header["subkey_engine"]), writer, True, backend,
+                                                num_blocks, utils.header_last_block_size(header))
+        return blocks, writer, compute, write
+
+    await run_job(loop, executor, setup, cores, progress)
+
+
+def get_plan(raw_key, subkey_engine):
+    if raw_key is None:
+        raise ValueError("This file requires a raw key")
+    return encryptor.get_plan(raw_key, subkey_engine)
+
+
+async def run_job(loop, executor, setup, cores, progress):
+    """Runs `setup` on the executor, then all batches, and closes the files and `progress`."""
+    try:
+        blocks, writer, compute, write = await loop.run_in_executor(executor, setup)
+        try:
+            await run_batches(loop, executor, blocks, compute, write, cores, progress)
+        finally:
+            # Closing flushes the output with direct I/O, so it runs off the loop too
+            await loop.run_in_executor(executor, close_files, blocks, writer)
+    finally:
+        encryptor.trim_scratch_pool()
+        if progress:
+            progress.close()
+
+
+def close_files(blocks, writer):
+    try:
+        writer.close()
+    finally:
+        blocks.close()
+
+
+async def run_batches(loop, executor, blocks, compute, write, cores, progress):
+    """
+    Runs batches of consecutive blocks on `executor`, at most `cores` at a time.
+    Each batch is read into pooled scratch, computed and written by one thread; blocks
+    are written at fixed offsets, so batches may finish in any order.
+    """
+    cores = cores or utils.get_default_core_count()
+    num_blocks = len(blocks)
+    batch_size = encryptor.choose_batch_size(cores)
+
+    def run_batch(start, count):
+        with encryptor.borrow_scratch(count) as scratch:
+            for n in range(count):
+                blocks.read_into(start + n, scratch["block"][n])
+            write(start, compute(start, count, scratch))
+        return count
+
+    starts = iter(range(0, num_blocks, batch_size))
+    pending = set()
+    processed_blocks = 0
+    try:
+        while True:
+            for start in itertools.islice(starts, cores - len(pending)):
+                count = min(batch_size, num_blocks - start)
+                pending.add(loop.run_in_executor(executor, run_batch, start, count))
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                processed_blocks += future.result()
+                if progress:
+                    progress.update(processed_blocks, num_blocks)
+    finally:
+        # Running batches cannot be interrupted, the files stay open until they finish
+        while pending:
+            try:
+                _, pending = await asyncio.wait(pending)
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,37 @@
+"""
+Registry of compute backends for the block transform.
+Backends are registered by `encryptor` and selected with `set-preference --engine`.
+"""
+
+DEFAULT_BACKEND = "numpy"
+BACKENDS = {}
+
+
+class Backend:
+    """
+    A compute backend.
+    `transform(plan, work, subkeys, decrypt, scratch)` runs a plan over a stack of blocks
+    and returns the stack holding the result.
+    `expand_subkey(initial_seed, algorithm_name)` expands a block's subkey seed to 1MB.
+    """
+    def __init__(self, name, transform, expand_subkey, description=""):
+        self.name = name
+        self.transform = transform
+        self.expand_subkey = expand_subkey
+        self.description = description
+
+
+def register_backend(backend):
+    BACKENDS[backend.name] = backend
+
+
+def available_backends():
+    return list(BACKENDS.keys())
+
+
+def get_backend(name=None):
+    """Returns the backend registered as `name`, or the default backend."""
+    name = name or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown engine '{name}'. Available engines: {', '.join(available_backends())}")
+    return BACKENDS[name]
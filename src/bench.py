@@ -0,0 +1,131 @@
+import os
+import time
+import key_utils
+import backends
+import encryptor
+import subkey_cache
+from cfg import *
+
+
+def average_time(func, rounds=5):
+    """Runs `func` `rounds` times and returns the average seconds per call."""
+    start_time = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start_time) / rounds
+
+
+def cold(func):
+    """
+    Wraps `func` to empty the process-wide subkey cache first, so repeated timed calls
+    derive and expand their subkeys like the first rather than hitting the cache.
+    """
+    def run():
+        subkey_cache.shared_cache.clear()
+        return func()
+    return run
+
+
+def subkey_expansion(rounds=5, algorithm_name="sha512"):
+    """
+    Micro-benchmark of subkey expansion.
+    Returns milliseconds per MB of subkey for the vectorized and loop expanders.
+    """
+    seed = key_utils.primary_hash(b"testing@123")
+    vectorized = average_time(lambda: key_utils.expand_subkey(seed, algorithm_name), rounds)
+    loop = average_time(lambda: key_utils.expand_subkey_loop(seed, algorithm_name), rounds)
+    return {
+        "vectorized_ms_per_mb": round(vectorized * 1000, 3),
+        "loop_ms_per_mb": round(loop * 1000, 3),
+        "speedup": round(loop / vectorized, 2),
+    }
+
+
+def block_transform(rounds=10, engine=None):
+    """
+    Micro-benchmark of the per-block hot path through a cached `TransformPlan`.
+    Returns milliseconds per block for plan setup, encryption and decryption on `engine`.
+    """
+    raw_key = b"testing@123"
+    block = os.urandom(BLOCK_SIZE)
+    backend = backends.get_backend(engine)
+    setup = average_time(lambda: encryptor.TransformPlan(raw_key), 1)
+    plan = encryptor.get_plan(raw_key)
+    # Warm-up call, so JIT compilation is not timed
+    plan.encrypt_block(0, block, backend)
+    encrypt = average_time(cold(lambda: plan.encrypt_block(0, block, backend)), rounds)
+    decrypt = average_time(cold(lambda: plan.decrypt_block(0, block, backend)), rounds)
+    return {
+        "engine": backend.name,
+        "plan_setup_ms": round(setup * 1000, 3),
+        "encrypt_ms_per_block": round(encrypt * 1000, 3),
+        "decrypt_ms_per_block": round(decrypt * 1000, 3),
+    }
+
+
+def subkey_engines(rounds=5):
+    """Throughput of every versioned subkey engine, in MB of subkey per second."""
+    primary_hash = key_utils.primary_hash(b"testing@123")
+    results = {}
+    for engine_id, (name, _) in key_utils.SUBKEY_ENGINES.items():
+        seconds = average_time(lambda: key_utils.derive_subkey(primary_hash, b"testing@123", 0,
+                                                               subkey_engine=engine_id), rounds)
+        results[name] = round(1 / seconds, 2)
+    return results
+
+
+def key_length_scaling(lengths=(6, 1024, 64 * 1024, BLOCK_SIZE), rounds=20):
+    """
+    Per-block subkey cost against key length, from a typed key up to a 1MB keyfile.
+    Returns microseconds per block seed with the absorbed prefix and with a full rehash,
+    and milliseconds per whole subkey.
+    """
+    results = []
+    for length in lengths:
+        raw_key = os.urandom(length)
+        primary_hash = key_utils.primary_hash(raw_key)
+        prefix = key_utils.seed_prefix(primary_hash, raw_key)
+        index_bytes = (1).to_bytes(8, "big")
+        absorbed = average_time(lambda: key_utils.block_seed(prefix, 1), rounds)
+        rehash = average_time(lambda: key_utils.hashlib.sha512(primary_hash + raw_key + index_bytes).digest(), rounds)
+        subkey = average_time(lambda: key_utils.derive_subkey(primary_hash, raw_key, 1, prefix=prefix), max(rounds // 4, 1))
+        results.append({
+            "key_bytes": length,
+            "seed_us_absorbed": round(absorbed * 1e6, 2),
+            "seed_us_rehash": round(rehash * 1e6, 2),
+            "subkey_ms": round(subkey * 1000, 3),
+        })
+    return results
+
+
+def io_modes(directory, size_mb=64, cores=None):
+    """
+    Encrypts and decrypts a `size_mb` test file in `directory` with buffered and with direct I/O.
+    Returns MB/s per mode and direction. The test files are removed afterwards.
+    """
+    raw_key = b"testing@123"
+    paths = [os.path.join(directory, name) for name in ("io_bench.bin", "io_bench.enc", "io_bench.dec")]
+    test_file, encrypted_file, decrypted_file = paths
+    with open(test_file, "wb") as f:
+        for _ in range(size_mb):
+            f.write(os.urandom(BLOCK_SIZE))
+    results = {}
+    try:
+        # Warm-up pass, so both modes see the same plan and page cache state; every timed
+        # run starts from an empty subkey cache
+        encryptor.encrypt_file(test_file, encrypted_file, raw_key, cores=cores)
+        encryptor.decrypt_file(encrypted_file, decrypted_file, raw_key, cores=cores)
+        for mode, direct_io in (("buffered", False), ("direct", True)):
+            encrypt = average_time(cold(lambda: encryptor.encrypt_file(test_file, encrypted_file, raw_key, cores=cores,
+                                                                       direct_io=direct_io)), 1)
+            decrypt = average_time(cold(lambda: encryptor.decrypt_file(encrypted_file, decrypted_file, raw_key,
+                                                                       cores=cores, direct_io=direct_io)), 1)
+            results[mode] = {
+                "encrypt_mb_per_s": round(size_mb / encrypt, 2),
+                "decrypt_mb_per_s": round(size_mb / decrypt, 2),
+            }
+    finally:
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+    return results
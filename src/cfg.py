@@ -4,7 +4,27 @@ RSA_KEY_SIZE = 4096
 SWAP_COUNT = 512
 MATRIX_SIZE = 1024
 CMD_HISTORY_LIMIT = 100
+HEADER_FLAG_RSA = 0x01
+HEADER_FLAG_SUBKEY_ENGINE = 0x02 # A subkey engine ID byte follows the flags
+HEADER_FLAG_STREAM = 0x04 # Streaming format, the last block size is a trailer after the blocks
+HEADER_FLAGS_MASK = HEADER_FLAG_RSA | HEADER_FLAG_SUBKEY_ENGINE | HEADER_FLAG_STREAM
+STREAM_TRAILER_SIZE = 8
+BENCHMARK_LOG_LIMIT = 50
 MIN_KEY_LEN = 4
+DEFAULT_SUBKEY_ENGINE = 0 # Chained SHA-512, readable by every Enigmatrix version
+PLAN_CACHE_SIZE = 4 # Compiled per-key transform plans kept in memory
+BATCH_MEMORY_BUDGET = 256*1024*1024 # 256 MB across all in-flight batches
+MAX_BATCH_BLOCKS = 16
+PIPELINE_QUEUE_DEPTH = 2 # Batches buffered between the reader, compute and writer stages
+BUFFER_ALIGNMENT = 4096 # Page-aligned block buffers, as O_DIRECT requires
+DIRECT_IO_FLUSH_BYTES = 64*1024*1024 # Buffered writes dropped from the page cache in direct I/O mode
+READER_CACHE_BLOCKS = 32 # Decrypted blocks kept by an EnigmatrixReader
+READER_PREFETCH_BLOCKS = 4 # Blocks decrypted ahead of sequential reads
+MANIFEST_SUFFIX = ".manifest" # Sidecar of per-block plaintext digests, next to the encrypted file
+MANIFEST_DIGEST_SIZE = 16
+ENCRYPTED_SUFFIX = ".enc" # Appended to file names mirrored by encrypt-dir
+SYNC_INDEX_FILE = ".enigmatrix-index.json" # encrypt-dir index, kept in the target directory
+SUBKEY_CACHE_BUDGET = 64*1024*1024 # 64 MB of derived subkeys shared by all jobs
 ASCII_FILE = "./terminal_texts/ascii_enigmatrix.txt"
 CONFIG_FILE = "./config.json"
 NORMAL_WINDOW_SIZE = (1200,800)
@@ -0,0 +1,435 @@
+"""
+Headless command line interface, usable without PyQt6.
+Run as `python -m enigmatrix <command>` from the `src` directory.
+"""
+import argparse
+import contextlib
+import getpass
+import json
+import os
+import sys
+import time
+import utils
+import key_utils
+import backends
+import encryptor
+import file_io
+import dir_sync
+import bench
+import subkey_cache
+from cfg import *
+
+
+class Signal:
+    """Stand-in for a Qt signal, `emit` calls a plain function."""
+    def __init__(self, slot=None):
+        self.slot = slot
+
+    def emit(self, *args):
+        if self.slot:
+            self.slot(*args)
+
+
+class TextProgress:
+    """Replaces `WorkerSignals` with a single-line text progress bar on stderr."""
+    def __init__(self, stream=sys.stderr):
+        self.stream = stream
+        self.last_percent = -1
+        self.update_terminal = Signal(self.message)
+        self.nblock_update = Signal(self.blocks)
+        self.time1 = Signal()
+        self.time2 = Signal()
+        self.progress_update = Signal()
+        self.terminal_progress = Signal()
+
+    def message(self, text):
+        text = text.strip()
+        if text:
+            self.stream.write(text + "\n")
+
+    def blocks(self, processed_blocks, num_blocks):
+        percent = int(processed_blocks * 100 / num_blocks)
+        if percent == self.last_percent:
+            return
+        self.last_percent = percent
+        filled = percent // 5
+        self.stream.write(f"\r[{'#' * filled}{' ' * (20 - filled)}] {percent:3d}% ({processed_blocks}/{num_blocks} blocks)")
+        if processed_blocks == num_blocks:
+            self.stream.write("\n")
+        self.stream.flush()
+
+
+class JsonProgress:
+    """Replaces `WorkerSignals` with one JSON object per line on stdout, for scripts."""
+    def __init__(self, stream=sys.stdout):
+        self.stream = stream
+        self.update_terminal = Signal(self.message)
+        self.nblock_update = Signal(self.blocks)
+        self.time1 = Signal()
+        self.time2 = Signal()
+        self.progress_update = Signal()
+        self.terminal_progress = Signal()
+
+    def emit(self, event, **fields):
+        self.stream.write(json.dumps({"event": event, **fields}) + "\n")
+        self.stream.flush()
+
+    def message(self, text):
+        text = text.strip()
+        if text:
+            self.emit("message", text=text)
+
+    def blocks(self, processed_blocks, num_blocks):
+        self.emit("progress", blocks=processed_blocks, total=num_blocks)
+
+
+def read_key(args):
+    """Resolves the raw key from --keyfile, --key-env, --key or an interactive prompt."""
+    if args.keyfile:
+        return key_utils.load_keyfile(args.keyfile)
+    if args.key_env:
+        if args.key_env not in os.environ:
+            raise ValueError(f"Environment variable '{args.key_env}' is not set")
+        return os.environ[args.key_env].encode()
+    if args.key:
+        return args.key.encode()
+    if sys.stdin.isatty():
+        return getpass.getpass("Key: ").encode()
+    return None
+
+
+def job_options(args):
+    return {
+        "cores": args.cores,
+        "executor": args.executor,
+        "engine": args.engine,
+        "queue_depth": args.queue_depth,
+        "direct_io": args.direct_io,
+    }
+
+
+def public_key_arg(args, raw_key):
+    """Loads the --rsa public key that protects `raw_key`, or returns None."""
+    if not args.rsa:
+        return None
+    if key_utils.detect_rsa_key(args.rsa) != "public":
+        raise ValueError(f"Selected RSA key is not public \"{args.rsa}\"")
+    public_key = key_utils.load_rsa_key(args.rsa)
+    if len(raw_key) > key_utils.rsa_max_key_len(public_key):
+        raise ValueError(f"Key is too long to protect with RSA (maximum {key_utils.rsa_max_key_len(public_key)} bytes)")
+    return public_key
+
+
+def check_encrypt_args(parser, args):
+    """Rejects `encrypt` flag combinations that would otherwise be ignored or fall back silently."""
+    if args.append:
+        if "-" in (args.input, args.output):
+            parser.error("--append needs an input file and an existing encrypted output, not a pipe")
+        if not os.path.exists(args.output):
+            parser.error(f"--append needs an existing encrypted output, \"{args.output}\" does not exist")
+        if args.manifest:
+            parser.error("--manifest cannot be combined with --append")
+    if args.manifest or args.delta:
+        if "-" in (args.input, args.output):
+            parser.error("--manifest and --delta need an input and an output file, not a pipe")
+    if args.executor == "process" and (args.append or args.manifest or args.delta):
+        parser.error("--append, --manifest and --delta run on the thread executor, not --executor process")
+
+
+def encrypt_cmd(args, reporter):
+    if args.append:
+        return append_cmd(args, reporter)
+    raw_key = read_key(args)
+    if not raw_key or len(raw_key) < MIN_KEY_LEN:
+        raise ValueError(f"Key length should be minimum of {MIN_KEY_LEN} characters")
+    public_key = public_key_arg(args, raw_key)
+    subkey_engine = key_utils.subkey_engine_id(args.subkey_engine)
+    if "-" in (args.input, args.output):
+        return run_stream_job(encryptor.encrypt_stream, args, raw_key, public_key, subkey_engine=subkey_engine)
+    if args.delta:
+        return run_job(encryptor.delta_encrypt_file, args, reporter, raw_key, public_key, subkey_engine=subkey_engine)
+    return run_job(encryptor.encrypt_file, args, reporter, raw_key, public_key, subkey_engine=subkey_engine,
+                   write_manifest=args.manifest)
+
+
+def encrypt_dir_cmd(args, reporter):
+    raw_key = read_key(args)
+    if not raw_key or len(raw_key) < MIN_KEY_LEN:
+        raise ValueError(f"Key length should be minimum of {MIN_KEY_LEN} characters")
+    result = dir_sync.sync_directory(args.source, args.target, raw_key, public_key_arg(args, raw_key), args.cores,
+                                     args.engine, key_utils.subkey_engine_id(args.subkey_engine), args.queue_depth,
+                                     args.direct_io, full=not args.sync, signals=reporter)
+    return {"source": args.source, "target": args.target, **result}
+
+
+def decrypt_cmd(args, reporter):
+    ranged = args.offset is not None or args.length is not None
+    if ranged and args.input == "-":
+        raise ValueError("--offset and --length need a seekable encrypted file, not stdin")
+    if args.input == "-":
+        # The header is only read once the stream is, so the key requirements are checked then
+        private_key = read_private_key(args.rsa) if args.rsa else None
+        return run_stream_job(encryptor.decrypt_stream, args, read_key(args), private_key)
+    raw_key, private_key = file_keys(args, args.input)
+    if ranged:
+        return range_job(args, reporter, raw_key, private_key)
+    if args.output == "-":
+        return run_stream_job(encryptor.decrypt_stream, args, raw_key, private_key)
+    return run_job(encryptor.decrypt_file, args, reporter, raw_key, private_key)
+
+
+def append_cmd(args, reporter):
+    """Appends the input to the existing encrypted output with `encryptor.append_file`."""
+    if os.path.abspath(args.input) == os.path.abspath(args.output):
+        raise ValueError("Input and output file paths cannot be same")
+    raw_key, private_key = file_keys(args, args.output)
+    start_time = time.perf_counter()
+    pipeline = encryptor.append_file(args.input, args.output, raw_key, private_key, args.cores, args.engine,
+                                     args.queue_depth, args.direct_io, signals=reporter)
+    return {
+        "input": args.input,
+        "output": args.output,
+        "bytes": os.path.getsize(args.input),
+        "seconds": round(time.perf_counter() - start_time, 6),
+        "pipeline": pipeline,
+    }
+
+
+def file_keys(args, path):
+    """Returns the `(raw_key, private_key)` pair the existing encrypted file `path` needs."""
+    if not utils.check_encrypted(path):
+        raise ValueError("Selected file is not encrypted by this software, or file might be corrupted")
+    if utils.read_header(path)["rsa_flag"]:
+        if not args.rsa:
+            raise ValueError("This file requires an RSA private key, use --rsa")
+        return None, read_private_key(args.rsa)
+    raw_key = read_key(args)
+    if not raw_key:
+        raise ValueError("This file requires a key, use --key, --keyfile or --key-env")
+    return raw_key, None
+
+
+def read_private_key(path):
+    if key_utils.detect_rsa_key(path) != "private":
+        raise ValueError(f"Selected RSA key is not private \"{path}\"")
+    return key_utils.load_rsa_key(path)
+
+
+def run_job(func, args, reporter, raw_key, rsa_key, **kwargs):
+    if os.path.abspath(args.input) == os.path.abspath(args.output):
+        raise ValueError("Input and output file paths cannot be same")
+    start_time = time.perf_counter()
+    pipeline = func(args.input, args.output, raw_key, rsa_key, signals=reporter, **job_options(args), **kwargs)
+    return {
+        "input": args.input,
+        "output": args.output,
+        # Plaintext bytes: the input of an encryption, the output of a decryption
+        "bytes": os.path.getsize(args.output if func is encryptor.decrypt_file else args.input),
+        "seconds": round(time.perf_counter() - start_time, 6),
+        "pipeline": pipeline,
+    }
+
+
+def open_stream(path, mode):
+    """Opens a binary file, or stdin/stdout for `-`, which are left open."""
+    if path == "-":
+        return contextlib.nullcontext(sys.stdin.buffer if "r" in mode else sys.stdout.buffer)
+    return open(path, mode)
+
+
+def run_stream_job(func, args, raw_key, rsa_key, **kwargs):
+    """Runs `encrypt_stream` or `decrypt_stream` between files, stdin (`-`) and stdout (`-`)."""
+    if args.input != "-" and args.output != "-" and os.path.abspath(args.input) == os.path.abspath(args.output):
+        raise ValueError("Input and output file paths cannot be same")
+    start_time = time.perf_counter()
+    with open_stream(args.input, "rb") as input_stream, open_stream(args.output, "wb") as output_stream:
+        pipeline = func(input_stream, output_stream, raw_key, rsa_key, cores=args.cores, engine=args.engine,
+                        queue_depth=args.queue_depth, **kwargs)
+    return {
+        "input": args.input,
+        "output": args.output,
+        "seconds": round(time.perf_counter() - start_time, 6),
+        "pipeline": pipeline,
+    }
+
+
+def range_job(args, reporter, raw_key, private_key):
+    """Decrypts `--length` bytes from `--offset` with `file_io.decrypt_range`."""
+    if (args.offset or 0) < 0 or (args.length or 0) < 0:
+        raise ValueError("--offset and --length cannot be negative")
+    start_time = time.perf_counter()
+    with open_stream(args.output, "wb") as output_stream:
+        written = file_io.decrypt_range(args.input, output_stream, args.offset or 0, args.length, raw_key,
+                                        private_key, args.cores, args.engine, signals=reporter)
+    return {
+        "input": args.input,
+        "output": args.output,
+        "offset": args.offset or 0,
+        "bytes": written,
+        "seconds": round(time.perf_counter() - start_time, 6),
+    }
+
+
+def inspect_cmd(args, reporter):
+    if not utils.check_encrypted(args.input):
+        raise ValueError("Selected file is not encrypted by this software, or file might be corrupted")
+    header = utils.read_header(args.input)
+    file_size = os.path.getsize(args.input)
+    num_blocks = utils.calculate_num_blocks(file_size - header["trailer_size"], header["header_size"])
+    engines = dict((engine_id, name) for engine_id, (name, _) in key_utils.SUBKEY_ENGINES.items())
+    return {
+        "file": args.input,
+        "file_size": file_size,
+        "header_size": header["header_size"],
+        "rsa": header["rsa_flag"],
+        "stream": header["stream"],
+        "subkey_engine": engines.get(header["subkey_engine"], header["subkey_engine"]),
+        "blocks": num_blocks,
+        "original_size": utils.plaintext_size(header, num_blocks),
+    }
+
+
+def benchmark_cmd(args, reporter):
+    if args.subkey:
+        return {"subkey_expansion": bench.subkey_expansion(), "subkey_engines": bench.subkey_engines(),
+                "key_length_scaling": bench.key_length_scaling()}
+    if args.transform:
+        return {"transform": [bench.block_transform(engine=name) for name in backends.available_backends()]}
+    if args.io:
+        return {"io": bench.io_modes(args.directory, args.size, args.cores)}
+    test_file = os.path.join(args.directory, "benchmark_testfile.bin")
+    output_file = os.path.join(args.directory, "benchmark_output.enc")
+    try:
+        with open(test_file, "wb") as f:
+            for _ in range(args.size):
+                f.write(os.urandom(BLOCK_SIZE))
+        # Subkeys cached by an earlier run in this process would skip their derivation
+        subkey_cache.shared_cache.clear()
+        start_time = time.perf_counter()
+        pipeline = encryptor.encrypt_file(test_file, output_file, b"testing@123", signals=reporter, **job_options(args))
+        seconds = time.perf_counter() - start_time
+    finally:
+        for path in (test_file, output_file):
+            if os.path.exists(path):
+                os.remove(path)
+    return {"size_mb": args.size, "seconds": round(seconds, 6), "mb_per_s": round(args.size / seconds, 2),
+            "pipeline": pipeline}
+
+
+def add_job_arguments(parser):
+    parser.add_argument("--cores", type=int, default=utils.get_default_core_count(), help="worker count")
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--engine", choices=backends.available_backends(), default=backends.DEFAULT_BACKEND)
+    parser.add_argument("--queue-depth", type=int, default=PIPELINE_QUEUE_DEPTH,
+                        help="batches buffered between pipeline stages")
+    parser.add_argument("--direct-io", action="store_true", help="keep input and output out of the page cache")
+
+
+def add_key_arguments(parser):
+    keys = parser.add_mutually_exclusive_group()
+    keys.add_argument("--key", help="key text (visible in the process list, prefer --key-env or --keyfile)")
+    keys.add_argument("--keyfile", help="use the raw bytes of a file as the key")
+    keys.add_argument("--key-env", help="read the key from this environment variable")
+    parser.add_argument("--rsa", help="RSA public key (encrypt) or private key (decrypt, encrypt --append) file")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="enigmatrix", description="Enigmatrix file encryption, without the GUI.")
+    parser.add_argument("--version", action="version", version=f"Enigmatrix {VERSION}")
+    parser.add_argument("--json", action="store_true", help="JSON lines progress and result on stdout")
+    parser.add_argument("--quiet", action="store_true", help="no progress output")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    encrypt = commands.add_parser("encrypt", help="encrypt a file")
+    encrypt.add_argument("input", help="file to encrypt, or - for stdin")
+    encrypt.add_argument("output", help="encrypted file, or - for stdout (streaming format)")
+    add_key_arguments(encrypt)
+    encrypt.add_argument("--subkey-engine", choices=key_utils.subkey_engine_names(), default="sha512-chain")
+    modes = encrypt.add_mutually_exclusive_group()
+    modes.add_argument("--append", action="store_true",
+                       help="append to an existing encrypted output, re-encrypting only its last block")
+    modes.add_argument("--delta", action="store_true",
+                       help="re-encrypt only the blocks that changed since the output was encrypted with a manifest")
+    encrypt.add_argument("--manifest", action="store_true",
+                         help=f"write per-block digests to <output>{MANIFEST_SUFFIX} for later --delta runs")
+    add_job_arguments(encrypt)
+    encrypt.set_defaults(func=encrypt_cmd)
+
+    encrypt_dir = commands.add_parser("encrypt-dir", help="encrypt a directory into a mirror of encrypted files")
+    encrypt_dir.add_argument("source", help="directory to encrypt")
+    encrypt_dir.add_argument("target", help=f"mirror directory, each file gets the {ENCRYPTED_SUFFIX} suffix")
+    add_key_arguments(encrypt_dir)
+    encrypt_dir.add_argument("--subkey-engine", choices=key_utils.subkey_engine_names(), default="sha512-chain")
+    encrypt_dir.add_argument("--sync", action="store_true",
+                             help="encrypt only new or changed files, move renamed ones and delete orphans")
+    add_job_arguments(encrypt_dir)
+    encrypt_dir.set_defaults(func=encrypt_dir_cmd)
+
+    decrypt = commands.add_parser("decrypt", help="decrypt a file")
+    decrypt.add_argument("input", help="encrypted file, or - for stdin")
+    decrypt.add_argument("output", help="decrypted file, or - for stdout")
+    add_key_arguments(decrypt)
+    decrypt.add_argument("--offset", type=int, help="decrypt only from this plaintext byte offset")
+    decrypt.add_argument("--length", type=int, help="decrypt only this many plaintext bytes")
+    add_job_arguments(decrypt)
+    decrypt.set_defaults(func=decrypt_cmd)
+
+    inspect = commands.add_parser("inspect", help="show the header of an encrypted file")
+    inspect.add_argument("input")
+    inspect.set_defaults(func=inspect_cmd)
+
+    benchmark = commands.add_parser("benchmark", help="measure encryption throughput")
+    modes = benchmark.add_mutually_exclusive_group()
+    modes.add_argument("--subkey", action="store_true", help="subkey expansion micro-benchmarks")
+    modes.add_argument("--transform", action="store_true", help="per-block transform on every engine")
+    modes.add_argument("--io", action="store_true", help="buffered against direct I/O")
+    benchmark.add_argument("--size", type=int, default=100, help="test file size in MB")
+    benchmark.add_argument("--directory", default=".", help="where the test files are written")
+    add_job_arguments(benchmark)
+    benchmark.set_defaults(func=benchmark_cmd)
+    return parser
+
+
+def print_result(result, stream=sys.stdout):
+    """Prints a command result as indented `key: value` lines."""
+    def walk(value, indent):
+        for key, item in value.items():
+            if isinstance(item, dict):
+                stream.write(f"{' ' * indent}{key}:\n")
+                walk(item, indent + 2)
+            elif isinstance(item, list):
+                stream.write(f"{' ' * indent}{key}:\n")
+                for entry in item:
+                    walk(entry, indent + 2) if isinstance(entry, dict) else stream.write(f"{' ' * (indent + 2)}{entry}\n")
+            else:
+                stream.write(f"{' ' * indent}{key}: {item}\n")
+    walk(result, 0)
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "encrypt":
+        check_encrypt_args(parser, args)
+    # Data written to stdout leaves reports to stderr
+    out = sys.stderr if getattr(args, "output", None) == "-" else sys.stdout
+    if args.quiet:
+        reporter = None
+    elif args.json:
+        reporter = JsonProgress(out)
+    else:
+        reporter = TextProgress()
+    try:
+        result = args.func(args, reporter)
+    except (OSError, ValueError) as e:
+        if args.json:
+            print(json.dumps({"event": "error", "error": str(e)}), file=out)
+        else:
+            print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps({"event": "result", **result}), file=out)
+    else:
+        print_result(result, out)
+    return 0
+
@@ -5,7 +5,7 @@ COMMANDS = {}
 COMMAND_ALIASES = {}
 
 COMMAND_CATEGORIES = {
-    "encryption": ["encrypt", "decrypt"],
+    "encryption": ["encrypt", "decrypt", "encrypt-dir"],
     "general": ["run-as-admin", "cd", "cwd", "tree", "info", "aliases", "clear", "exit"],
     "utility": ["mode", "set-preference", 'rsa', 'benchmark'],
     "misc": ['ascii-art',"echo",'#']
@@ -19,12 +19,28 @@ COMMAND_DESCRIPTIONS = {
     "ascii-art": ("Displays the \"Enigmatrix\" ASCII art on the screen\n"
                   "--clear -> Clears the screen and then displays the ASCII art of \"Enigmatrix\"."),
     "encrypt": ("Encrypts a file. \nUsage: encrypt <input_path> <output_path> <key> [rsa_file_path]\n"
-                "or :   ecnrypt --input <path> --output <path> --key <key> [--rsa file_path]\n\n"
+                "or :   ecnrypt --input <path> --output <path> --key <key> [--rsa file_path]\n"
+                "or :   ecnrypt --input <path> --output <path> --keyfile <path> [--rsa file_path]\n\n"
+                "--keyfile -> Uses the raw bytes of a file (any length) as the key.\n"
+                "--append -> Appends the input to an existing encrypted output file, re-encrypting only\n"
+                "its last block. Use the key of that file, or its RSA private key with --rsa.\n"
+                "--delta -> Re-encrypts over a previous encryption of the file, rewriting only the blocks\n"
+                "that changed. The first run encrypts in full and saves block digests next to the output.\n\n"
                 "Legend:\n"
                 "<> -> Required\n"
                 "[] -> Optional"),
+    "encrypt-dir": ("Encrypts every file of a directory into a mirror directory, adding the .enc suffix.\n"
+                    "Usage: encrypt-dir <source_dir> <target_dir> <key> [rsa_file_path]\n"
+                    "or :   encrypt-dir --input <dir> --output <dir> [--key key | --keyfile path] [--rsa file_path]\n\n"
+                    "--sync -> Encrypts only new or changed files, moves the encrypted copies of renamed files\n"
+                    "and deletes those of removed files, using the index kept in the target directory.\n\n"
+                    "Legend:\n"
+                    "<> -> Required\n"
+                    "[] -> Optional"),
     "decrypt": ("Usage: decrypt <input_path> <output_path> [key] [rsa_file_path]\n"
-                "or :   decrypt --input <path> --output <path> [--key key] [--rsa file_path]\n\n"
+                "or :   decrypt --input <path> --output <path> [--key key | --keyfile path] [--rsa file_path]\n\n"
+                "--offset <bytes> --length <bytes> -> Decrypts only that byte range of the original file,\n"
+                "decrypting just the blocks that cover it. Either can be left out.\n\n"
                 "Legend:\n"
                 "<> -> Required\n"
                 "[] -> Optional / Conditional"),
@@ -73,6 +89,22 @@ COMMAND_DESCRIPTIONS = {
                         "--cores <number> -> Sets the number of CPU cores used for encryption/decryption.\n"
                         "   Example: --cores 4 (Uses 4 CPU cores for operations)\n"
                         "   Minimum: 2 | Maximum: Based on your system's CPU count.\n\n"
+                        "--executor <thread|process> -> Sets how blocks are processed in parallel.\n"
+                        "   thread  -> Worker threads in the same process (default).\n"
+                        "   process -> Worker processes that map the input and write their blocks directly to the output.\n"
+                        "              Scales better with many cores on large files.\n\n"
+                        "--engine <name> -> Sets the compute backend for the block transform.\n"
+                        "   numpy     -> Fused in-place NumPy kernel (default).\n"
+                        "   reference -> Original NumPy implementation, for comparison.\n"
+                        "   numba     -> JIT-compiled kernels, available when numba is installed.\n\n"
+                        "--subkey <name> -> Sets the subkey engine used for newly encrypted files.\n"
+                        "   sha512-chain -> Chained SHA-512 expansion, readable by every version (default).\n"
+                        "   shake256     -> One SHAKE256 call per 1MB subkey.\n"
+                        "   aes-ctr      -> AES-256-CTR keystream per 1MB subkey.\n"
+                        "   The engine is recorded in the file header, so decryption picks it up automatically.\n\n"
+                        "--subkey-cache <MB> -> Memory for derived subkeys reused across runs with the same key (default 64, 0 disables).\n"
+                        "--queue-depth <n> -> Batches buffered between the reader, compute and writer stages (default 2).\n"
+                        "--direct-io <on|off> -> Keeps input and output out of the OS page cache, for very large files (default off).\n\n"
                         "Example Usage:\n"
                         "set-preference --ui terminal --window fullscreen --cores 4\n"
                         "Changes preference to full terminal mode, fullscreen window, and 4 CPU cores for processing every time you launch Enigmatrix.\n\n"
@@ -85,11 +117,18 @@ COMMAND_DESCRIPTIONS = {
                    "to ensure balanced performance.\n"
                    "Notes: \n"
                    "    - The test file is automatically generated and deleted after benchmarking.\n"
-                   "    - This command does not affect any user files."),
+                   "    - This command does not affect any user files.\n\n"
+                   "--subkey -> Micro-benchmarks subkey expansion, MB/s per subkey engine and per-block cost by key length.\n"
+                   "--transform -> Micro-benchmarks the per-block transform on every available engine.\n"
+                   "--io -> Compares encryption/decryption throughput with buffered and direct I/O on a 64MB file.\n"
+                   "--engine <name> -> Runs the benchmark with this engine instead of the preferred one.\n"
+                   "Each result is logged with its cores, executor and engine (see info --config)."),
     "info" : ("Displays Enigmatrix configuration info, including CPU cores used and current version.\n"
               "--cores   -> shows the number of cores used by encryption/decryption process\n"
               "--version -> shows the current version of Enigmatrix.\n"
-              "--config  -> Displays the stored configuration settings."),
+              "--config  -> Displays the stored configuration settings.\n"
+              "--cache   -> Shows subkey cache usage and hit/miss counters for this session.\n"
+              "--pipeline -> Shows queue occupancy and stage wait times of the last encryption/decryption."),
     "echo" : ("Simply prints the given text to terminal.\n"
               "try \"echo Hello, World!\""),
     "print" : ("Simply prints the given text to terminal.\n"
@@ -6,8 +6,13 @@ import ctypes
 import psutil
 import shlex
 import utils
+import bench
+import backends
+import subkey_cache
 import key_utils
 import encryptor
+import file_io
+import dir_sync
 from PyQt6.QtCore import Qt, QThreadPool
 from PyQt6.QtWidgets import QApplication
 from parallel_worker import *
@@ -189,6 +194,11 @@ def encrypt_cmd(app,input_file=None,output_file=None,raw_key=None,rsa_key=None,*
     pref = config.get("preferences")
     benchmarks = config.get("benchmarks")
     cores = pref.get("cores")
+    executor = pref.get("executor", "thread")
+    queue_depth = pref.get("queue_depth", PIPELINE_QUEUE_DEPTH)
+    direct_io = pref.get("direct_io", False)
+    engine = pref.get("engine", backends.DEFAULT_BACKEND)
+    subkey_engine = key_utils.subkey_engine_id(pref.get("subkey_engine", "sha512-chain"))
     inp = input_file if input_file else None
     out = output_file if output_file else None
     key = raw_key if raw_key else None
@@ -198,9 +208,14 @@ def encrypt_cmd(app,input_file=None,output_file=None,raw_key=None,rsa_key=None,*
     out = kwargs.get("output") if "output" in kwargs.keys() else out
     key = kwargs.get("key") if "key" in kwargs.keys() else key
     rsa = kwargs.get("rsa") if "rsa" in kwargs.keys() else rsa
+    keyfile = kwargs.get("keyfile")
+    append = kwargs.get("append")
+    # Delta runs rewrite only the changed blocks, the first one encrypts in full and writes the manifest
+    callback = encryptor.delta_encrypt_file if kwargs.get("delta") else encryptor.encrypt_file
     # Check if all the required values are provided or not
-    _req = (inp,out,key)
-    if not all(isinstance(a, str) for a in _req):
+    _req = (inp,out)
+    # Appending to an RSA file needs only its private key
+    if not all(isinstance(a, str) for a in _req) or not (isinstance(key, str) or isinstance(keyfile, str) or (append and isinstance(rsa, str))):
         return app.retro_terminal.type_text(get_help_text( 'encrypt'))
     # Normalizing paths
     cwd = app.retro_terminal.cwd
@@ -214,6 +229,10 @@ def encrypt_cmd(app,input_file=None,output_file=None,raw_key=None,rsa_key=None,*
         return app.retro_terminal.type_text(f"Error: No such file exists: \"{inp}\"")
     if not os.path.isdir(out_dir):
         return app.retro_terminal.type_text(f"Error: No such directory exists \"{out_dir}\"")
+    if keyfile:
+        keyfile = os.path.abspath(os.path.join(cwd, keyfile))
+        if not os.path.isfile(keyfile):
+            return app.retro_terminal.type_text(f"Error: No such keyfile exists: \"{keyfile}\"")
     if rsa:
         if not os.path.isdir(rsa_dir):
             return app.retro_terminal.type_text("Your RSA directory does not exists, please select RSA directory again.")
@@ -224,11 +243,23 @@ def encrypt_cmd(app,input_file=None,output_file=None,raw_key=None,rsa_key=None,*
     # Handling crucial conditions
     if inp == out:
         return app.retro_terminal.type_text("Error: Input and output file paths cannot be same")
+    if append and kwargs.get("delta"):
+        return app.retro_terminal.type_text("Error: --append and --delta cannot be combined")
+    if append and not os.path.exists(out):
+        return app.retro_terminal.type_text(f"Error: No such encrypted file exists to append to: \"{out}\"")
+    if append:
+        return confirm_append(app, inp, out, key, keyfile, rsa, cores, engine, queue_depth, direct_io, benchmarks)
+    if not (isinstance(key, str) or isinstance(keyfile, str)):
+        return app.retro_terminal.type_text(get_help_text( 'encrypt'))
+    if keyfile:
+        rkey = keyfile
+        key = key_utils.load_keyfile(keyfile)
+    else:
+        rkey = key
+        key = key.encode()
     if len(key) < MIN_KEY_LEN:
         return app.retro_terminal.type_text(f"Error: Key length should be minimum of {MIN_KEY_LEN} characters.")
 
-    rkey = key
-    key = key.encode()
     file_size,_,lcs = utils.file_info(inp)
     readable_size = utils.readable_size(file_size)
     est_size = utils.readable_size(utils.estimate_encrypted_size(file_size))
@@ -243,9 +274,11 @@ def encrypt_cmd(app,input_file=None,output_file=None,raw_key=None,rsa_key=None,*
             return app.retro_terminal.type_text(f"Error: Selected RSA key is not public \"{rsa}\"")
         # RSA key is public. proceed for operation
         public_key = key_utils.load_rsa_key(rsa)
-        cb_args = (inp,out,key,public_key,cores)
+        if len(key) > key_utils.rsa_max_key_len(public_key):
+            return app.retro_terminal.type_text(f"Error: Key is too long to protect with RSA (maximum {key_utils.rsa_max_key_len(public_key)} bytes).")
+        cb_args = (inp,out,key,public_key,cores,executor,engine,subkey_engine,queue_depth,direct_io)
         msg_fin = f"Successfully Encrypted:\n \"{inp}\"\nSaved at:\n\"{out}\"\nUsing\n\"{rsa}\""
-        app.retro_terminal.set_pending_state(encryptor.encrypt_file, cb_args, msg_ini, msg_fin)
+        app.retro_terminal.set_pending_state(callback, cb_args, msg_ini, msg_fin)
         return app.retro_terminal.type_text(f"Confirmation:\n"
                                             f"Input:\n\"{inp}\"\n"
                                             f"File size: {readable_size}\n"
@@ -257,9 +290,9 @@ def encrypt_cmd(app,input_file=None,output_file=None,raw_key=None,rsa_key=None,*
                                             f"Operation : Encrypt\n"
                                             f"Are you sure you want to continue with this operation? (y/n)")
     else:
-        cb_args = (inp,out,key,None,cores)
+        cb_args = (inp,out,key,None,cores,executor,engine,subkey_engine,queue_depth,direct_io)
         msg_fin = f"Successfully Encrypted:\n\"{inp}\"\nSaved at:\n\"{out}\""
-        app.retro_terminal.set_pending_state(encryptor.encrypt_file, cb_args, msg_ini, msg_fin)
+        app.retro_terminal.set_pending_state(callback, cb_args, msg_ini, msg_fin)
         return app.retro_terminal.type_text(f"Confirmation:\n"
                                             f"Input:\n\"{inp}\"\n"
                                             f"File size: {readable_size}\n"
@@ -270,12 +303,54 @@ def encrypt_cmd(app,input_file=None,output_file=None,raw_key=None,rsa_key=None,*
                                             f"Are you sure you want to continue with this operation? (y/n)")
 
 
+def confirm_append(app, inp, out, key, keyfile, rsa, cores, engine, queue_depth, direct_io, benchmarks):
+    """Asks to confirm appending `inp` to the encrypted file `out`, re-encrypting only its last block."""
+    if not utils.check_encrypted(out):
+        return app.retro_terminal.type_text(f"Error: Output file is not encrypted by this software, or file might be corrupted.\n"
+                                            f"It cannot be appended to.")
+    private_key = None
+    if utils.read_header(out)["rsa_flag"]:
+        if not rsa:
+            return app.retro_terminal.type_text("This file requires RSA private key to append to. please select the key file and try again.")
+        if key_utils.detect_rsa_key(rsa) != "private":
+            return app.retro_terminal.type_text(f"Error: Selected RSA key is not private \"{rsa}\"")
+        private_key = key_utils.load_rsa_key(rsa)
+        key = None
+    elif keyfile:
+        key = key_utils.load_keyfile(keyfile)
+    elif key:
+        key = key.encode()
+    else:
+        return app.retro_terminal.type_text("This file requires its key to append to. please try again and enter key using --key or --keyfile")
+    bm_time = benchmarks.get(str(cores))
+    if not bm_time:
+        return app.retro_terminal.type_text(f"You have to run the benchmark command with {cores} cores to perform encryption / decryption")
+    # Only the appended bytes and the last block of the file are encrypted
+    file_size,*_ = utils.file_info(inp)
+    est_time = utils.estimate_encryption_time(file_size + BLOCK_SIZE, bm_time)
+    app.est_op_time = est_time
+    cb_args = (inp, out, key, private_key, cores, engine, queue_depth, direct_io)
+    msg_fin = f"Successfully Appended:\n\"{inp}\"\nTo:\n\"{out}\""
+    app.retro_terminal.set_pending_state(encryptor.append_file, cb_args, "Starting append process...", msg_fin)
+    return app.retro_terminal.type_text(f"Confirmation:\n"
+                                        f"Input:\n\"{inp}\"\n"
+                                        f"File size: {utils.readable_size(file_size)}\n"
+                                        f"Estimated time for operation : {est_time} seconds\n"
+                                        f"Append to:\n\"{out}\"\n"
+                                        f"Operation : Append\n"
+                                        f"Are you sure you want to continue with this operation? (y/n)")
+
+
 @command(name="decrypt",aliases=["dec"])
 def decrypt_cmd(app,input_file=None,output_file=None,raw_key=None,rsa_key=None,*args,**kwargs):
     config = utils.load_config()
     pref = config.get("preferences")
     benchmarks = config.get("benchmarks")
     cores = pref.get("cores")
+    executor = pref.get("executor", "thread")
+    queue_depth = pref.get("queue_depth", PIPELINE_QUEUE_DEPTH)
+    direct_io = pref.get("direct_io", False)
+    engine = pref.get("engine", backends.DEFAULT_BACKEND)
     inp = input_file if input_file else None
     out = output_file if output_file else None
     key = raw_key if raw_key else None
@@ -285,10 +360,22 @@ def decrypt_cmd(app,input_file=None,output_file=None,raw_key=None,rsa_key=None,*
     out = kwargs.get("output") if "output" in kwargs.keys() else out
     key = kwargs.get("key") if "key" in kwargs.keys() else key
     rsa = kwargs.get("rsa") if "rsa" in kwargs.keys() else rsa
+    keyfile = kwargs.get("keyfile")
+    offset = kwargs.get("offset")
+    length = kwargs.get("length")
     # Check if all the required values are provided or not
     _req = (inp, out)
-    if not all(isinstance(a, str) for a in _req) or (not key and not rsa):
+    if not all(isinstance(a, str) for a in _req) or (not key and not rsa and not keyfile):
         return app.retro_terminal.type_text(get_help_text( 'decrypt'))
+    # A byte range decrypts only the blocks covering it
+    ranged = offset is not None or length is not None
+    try:
+        offset = int(offset) if offset is not None else 0
+        length = int(length) if length is not None else None
+        if offset < 0 or (length is not None and length < 0):
+            raise ValueError
+    except ValueError:
+        return app.retro_terminal.type_text("Error: --offset and --length must be whole numbers of bytes")
     # Normalizing paths
     cwd = app.retro_terminal.cwd
     rsa_dir = utils.load_config()['rsa_directory']
@@ -301,6 +388,10 @@ def decrypt_cmd(app,input_file=None,output_file=None,raw_key=None,rsa_key=None,*
         return app.retro_terminal.type_text(f"Error: No such file exists: \"{inp}\"")
     if not os.path.isdir(out_dir):
         return app.retro_terminal.type_text(f"Error: No such directory exists \"{out_dir}\"")
+    if isinstance(keyfile, str):
+        keyfile = os.path.abspath(os.path.join(cwd, keyfile))
+        if not os.path.isfile(keyfile):
+            return app.retro_terminal.type_text(f"Error: No such keyfile exists: \"{keyfile}\"")
     # Handling crucial conditions
     if inp == out:
         return app.retro_terminal.type_text("Error: Input and output file paths cannot be same")
@@ -309,6 +400,8 @@ def decrypt_cmd(app,input_file=None,output_file=None,raw_key=None,rsa_key=None,*
                                             f"Choose a different file.")
     rsa_flag, rsa_enc_key, lcs = utils.read_file_header(inp)
     file_size,*_ = utils.file_info(inp)
+    if ranged:
+        file_size = min(length if length is not None else file_size, max(file_size - offset, 0))
     bm_time = benchmarks.get(str(cores))
     if not bm_time:
         return app.retro_terminal.type_text(f"You have to run the benchmark command with {cores} cores to perform encryption / decryption")
@@ -328,9 +421,13 @@ def decrypt_cmd(app,input_file=None,output_file=None,raw_key=None,rsa_key=None,*
             return app.retro_terminal.type_text(f"Error: Selected RSA key is not private \"{rsa}\"")
         # RSA key is private. proceed for operation
         private_key = key_utils.load_rsa_key(rsa)
-        cb_args = (inp, out,None,private_key,cores)
+        cb_args = (inp, out,None,private_key,cores,executor,engine,queue_depth,direct_io)
+        callback = encryptor.decrypt_file
+        if ranged:
+            cb_args = (inp, out, offset, length, None, private_key, cores, engine)
+            callback = file_io.decrypt_range
         msg_fin = f"Successfully Decrypted:\n \"{inp}\"\nSaved at:\n\"{out}\"\nUsing\n\"{rsa}\""
-        app.retro_terminal.set_pending_state(encryptor.decrypt_file, cb_args, msg_ini, msg_fin)
+        app.retro_terminal.set_pending_state(callback, cb_args, msg_ini, msg_fin)
         return app.retro_terminal.type_text(f"Confirmation:\n"
                                             f"Input:\n\"{inp}\"\n"
                                             f"Output:\n\"{out}\"\n"
@@ -339,13 +436,16 @@ def decrypt_cmd(app,input_file=None,output_file=None,raw_key=None,rsa_key=None,*
                                             f"Operation : Decrypt\n"
                                             f"Are you sure you want to continue with this operation? (y/n)")
     else:
-        if not key:
-            return app.retro_terminal.type_text(f"This file requires key for decryption. please try again and enter key using --key")
-        rkey = key
-        key = key.encode()
-        cb_args = (inp, out, key, None, cores)
+        if not key and not keyfile:
+            return app.retro_terminal.type_text(f"This file requires key for decryption. please try again and enter key using --key or --keyfile")
+        key = key_utils.load_keyfile(keyfile) if keyfile else key.encode()
+        cb_args = (inp, out, key, None, cores, executor, engine, queue_depth, direct_io)
+        callback = encryptor.decrypt_file
+        if ranged:
+            cb_args = (inp, out, offset, length, key, None, cores, engine)
+            callback = file_io.decrypt_range
         msg_fin = f"Successfully Decrypted:\n\"{inp}\"\nSaved at:\n\"{out}\""
-        app.retro_terminal.set_pending_state(encryptor.decrypt_file, cb_args, msg_ini, msg_fin)
+        app.retro_terminal.set_pending_state(callback, cb_args, msg_ini, msg_fin)
         return app.retro_terminal.type_text(f"Confirmation:\n"
                                             f"Input:\n\"{inp}\"\n"
                                             f"Output:\n\"{out}\"\n"
@@ -354,6 +454,59 @@ def decrypt_cmd(app,input_file=None,output_file=None,raw_key=None,rsa_key=None,*
                                             f"Are you sure you want to continue with this operation? (y/n)")
 
 
+@command(name="encrypt-dir",aliases=["encdir"])
+def encrypt_dir_cmd(app,source_dir=None,target_dir=None,raw_key=None,rsa_key=None,*args,**kwargs):
+    pref = utils.load_config().get("preferences")
+    cores = pref.get("cores")
+    queue_depth = pref.get("queue_depth", PIPELINE_QUEUE_DEPTH)
+    direct_io = pref.get("direct_io", False)
+    engine = pref.get("engine", backends.DEFAULT_BACKEND)
+    subkey_engine = key_utils.subkey_engine_id(pref.get("subkey_engine", "sha512-chain"))
+    inp = kwargs.get("input", source_dir)
+    out = kwargs.get("output", target_dir)
+    key = kwargs.get("key", raw_key)
+    rsa = kwargs.get("rsa", rsa_key)
+    keyfile = kwargs.get("keyfile")
+    sync = bool(kwargs.get("sync"))
+    if not all(isinstance(a, str) for a in (inp, out)) or not (isinstance(key, str) or isinstance(keyfile, str)):
+        return app.retro_terminal.type_text(get_help_text('encrypt-dir'))
+    cwd = app.retro_terminal.cwd
+    inp = os.path.abspath(os.path.join(cwd, inp))
+    out = os.path.abspath(os.path.join(cwd, out))
+    if not os.path.isdir(inp):
+        return app.retro_terminal.type_text(f"Error: No such directory exists \"{inp}\"")
+    if inp == out:
+        return app.retro_terminal.type_text("Error: Source and target directories cannot be same")
+    if keyfile:
+        keyfile = os.path.abspath(os.path.join(cwd, keyfile))
+        if not os.path.isfile(keyfile):
+            return app.retro_terminal.type_text(f"Error: No such keyfile exists: \"{keyfile}\"")
+        key = key_utils.load_keyfile(keyfile)
+    else:
+        key = key.encode()
+    if len(key) < MIN_KEY_LEN:
+        return app.retro_terminal.type_text(f"Error: Key length should be minimum of {MIN_KEY_LEN} characters.")
+    public_key = None
+    if rsa:
+        rsa = os.path.abspath(os.path.join(utils.load_config()['rsa_directory'], rsa))
+        if not os.path.exists(rsa):
+            app.load_rsa_keys(tprint=False)
+            return app.retro_terminal.type_text(f"Error: No such file exists: \"{rsa}\"")
+        if key_utils.detect_rsa_key(rsa) != "public":
+            return app.retro_terminal.type_text(f"Error: Selected RSA key is not public \"{rsa}\"")
+        public_key = key_utils.load_rsa_key(rsa)
+        if len(key) > key_utils.rsa_max_key_len(public_key):
+            return app.retro_terminal.type_text(f"Error: Key is too long to protect with RSA (maximum {key_utils.rsa_max_key_len(public_key)} bytes).")
+    cb_args = (inp, out, key, public_key, cores, engine, subkey_engine, queue_depth, direct_io, not sync)
+    msg_fin = f"Successfully Encrypted:\n\"{inp}\"\nSaved at:\n\"{out}\""
+    app.retro_terminal.set_pending_state(dir_sync.sync_directory, cb_args, "Starting directory encryption...", msg_fin)
+    return app.retro_terminal.type_text(f"Confirmation:\n"
+                                        f"Source:\n\"{inp}\"\n"
+                                        f"Target:\n\"{out}\"\n"
+                                        f"Operation : {'Sync' if sync else 'Encrypt every file'}\n"
+                                        f"Are you sure you want to continue with this operation? (y/n)")
+
+
 @command(name="clear", aliases=["cls"],add_prompt=False)
 def clear(app, *args, **kwargs):
     app.retro_terminal.add_ascii_art(welcome_msg=True,clear=True,speed=250)
@@ -521,7 +674,7 @@ def rsa_key_handle(app, *args, **kwargs):
                 app.retro_terminal.type_text("Select an RSA directory first.")
 
 @command(name="set-preference", aliases=["preference", "prefer"])
-def set_preference(app, window_mode=None, ui_mode=None, cores=None, *args, **kwargs):
+def set_preference(app, window_mode=None, ui_mode=None, cores=None, executor=None, engine=None, subkey=None, *args, **kwargs):
     """Modifies user preferences including window mode, UI mode, and core count."""
     config = utils.load_config()
     pref = config.get("preferences")
@@ -532,10 +685,22 @@ def set_preference(app, window_mode=None, ui_mode=None, cores=None, *args, **kwa
         pref["window_mode"] = "normal"
         pref["ui_mode"] = "gui"
         pref["cores"] = utils.get_default_core_count()
+        pref["executor"] = "thread"
+        pref["engine"] = backends.DEFAULT_BACKEND
+        pref["subkey_engine"] = "sha512-chain"
+        pref["subkey_cache_mb"] = SUBKEY_CACHE_BUDGET // (1024 * 1024)
+        pref["queue_depth"] = PIPELINE_QUEUE_DEPTH
+        pref["direct_io"] = False
         app.retro_terminal.type_text("Restoring preferences to default:")
         app.retro_terminal.type_text(f"- Window Mode: '{pref['window_mode']}'")
         app.retro_terminal.type_text(f"- UI Mode: '{pref['ui_mode']}'")
         app.retro_terminal.type_text(f"- Core Count: '{pref['cores']}'")
+        app.retro_terminal.type_text(f"- Executor: '{pref['executor']}'")
+        app.retro_terminal.type_text(f"- Engine: '{pref['engine']}'")
+        app.retro_terminal.type_text(f"- Subkey Engine: '{pref['subkey_engine']}'")
+        app.retro_terminal.type_text(f"- Subkey Cache: '{pref['subkey_cache_mb']}' MB")
+        app.retro_terminal.type_text(f"- Queue Depth: '{pref['queue_depth']}'")
+        app.retro_terminal.type_text("- Direct I/O: 'off'")
         utils.dump_config(config)
         app.init_preferences()
         return app.retro_terminal.type_text("Successfully restored preferences to default.")
@@ -543,9 +708,18 @@ def set_preference(app, window_mode=None, ui_mode=None, cores=None, *args, **kwa
     window_mode = kwargs.get("window", window_mode)
     ui_mode = kwargs.get("ui", ui_mode)
     cores = kwargs.get("cores", cores)
+    executor = kwargs.get("executor", executor)
+    engine = kwargs.get("engine", engine)
+    subkey = kwargs.get("subkey", subkey)
+    subkey_cache_mb = kwargs.get("subkey-cache")
+    queue_depth = kwargs.get("queue-depth")
+    direct_io = kwargs.get("direct-io")
     # Define valid options
     w_modes = {"fullscreen", "maximize", "normal", "small"}
     u_modes = {"terminal", "gui"}
+    executors = {"thread", "process"}
+    engines = backends.available_backends()
+    subkey_engines = key_utils.subkey_engine_names()
     max_cores = os.cpu_count() or 2
     min_cores = 2
     change_flag = False
@@ -568,6 +742,64 @@ def set_preference(app, window_mode=None, ui_mode=None, cores=None, *args, **kwa
             change_flag = True
         else:
             return app.retro_terminal.type_text(f"Invalid UI mode '{ui_mode}'. Valid options: {', '.join(u_modes)}")
+    # Validate and apply executor
+    if executor:
+        executor = str(executor).lower()
+        if executor in executors:
+            pref["executor"] = executor
+            app.retro_terminal.type_text(f"Setting executor as '{executor}'")
+            change_flag = True
+        else:
+            return app.retro_terminal.type_text(f"Invalid executor '{executor}'. Valid options: {', '.join(executors)}")
+    # Validate and apply compute engine
+    if engine:
+        engine = str(engine).lower()
+        if engine in engines:
+            pref["engine"] = engine
+            app.retro_terminal.type_text(f"Setting engine as '{engine}'")
+            change_flag = True
+        else:
+            return app.retro_terminal.type_text(f"Invalid engine '{engine}'. Available options: {', '.join(engines)}")
+    # Validate and apply subkey engine for new files
+    if subkey:
+        subkey = str(subkey).lower()
+        if subkey in subkey_engines:
+            pref["subkey_engine"] = subkey
+            app.retro_terminal.type_text(f"Setting subkey engine as '{subkey}'")
+            change_flag = True
+        else:
+            return app.retro_terminal.type_text(f"Invalid subkey engine '{subkey}'. Available options: {', '.join(subkey_engines)}")
+    # Validate and apply subkey cache budget
+    if subkey_cache_mb is not None:
+        try:
+            subkey_cache_mb = int(subkey_cache_mb)
+            if subkey_cache_mb < 0:
+                raise ValueError
+            pref["subkey_cache_mb"] = subkey_cache_mb
+            app.retro_terminal.type_text(f"Setting subkey cache as '{subkey_cache_mb}' MB")
+            change_flag = True
+        except ValueError:
+            return app.retro_terminal.type_text(f"Invalid subkey cache size '{subkey_cache_mb}'. Must be a whole number of MB (0 disables it).")
+    # Validate and apply pipeline queue depth
+    if queue_depth is not None:
+        try:
+            queue_depth = int(queue_depth)
+            if queue_depth < 1:
+                raise ValueError
+            pref["queue_depth"] = queue_depth
+            app.retro_terminal.type_text(f"Setting queue depth as '{queue_depth}'")
+            change_flag = True
+        except ValueError:
+            return app.retro_terminal.type_text(f"Invalid queue depth '{queue_depth}'. Must be a positive integer.")
+    # Validate and apply direct I/O mode
+    if direct_io is not None:
+        direct_io = str(direct_io).lower()
+        if direct_io in ("on", "off"):
+            pref["direct_io"] = direct_io == "on"
+            app.retro_terminal.type_text(f"Setting direct I/O as '{direct_io}'")
+            change_flag = True
+        else:
+            return app.retro_terminal.type_text(f"Invalid direct I/O mode '{direct_io}'. Valid options: on, off")
     # Validate and apply core count
     if cores:
         try:
@@ -599,10 +831,53 @@ def benchmark(app, cores=None, *args, **kwargs):
     """Runs an encryption benchmark using the specified number of cores."""
     min_cores = 1
     max_cores = os.cpu_count()
+    engine_override = kwargs.get("engine")
+    def run_subkey_benchmark(signals,*args,**kwargs):
+        """Micro-benchmark of subkey expansion, runs in the background thread."""
+        signals.update_terminal.emit("Running subkey expansion benchmark...")
+        result = bench.subkey_expansion()
+        signals.update_terminal.emit(f"Vectorized expansion: {result['vectorized_ms_per_mb']} ms per MB")
+        signals.update_terminal.emit(f"Loop expansion: {result['loop_ms_per_mb']} ms per MB")
+        signals.update_terminal.emit(f"Speedup: {result['speedup']}x")
+        signals.update_terminal.emit("Subkey engine throughput:")
+        for name, mb_per_second in bench.subkey_engines().items():
+            signals.update_terminal.emit(f"  {name}: {mb_per_second} MB/s")
+        signals.update_terminal.emit("Per-block cost by key length:")
+        for result in bench.key_length_scaling():
+            signals.update_terminal.emit(f"  {result['key_bytes']} byte key: seed {result['seed_us_absorbed']} us "
+                                         f"(rehash {result['seed_us_rehash']} us), subkey {result['subkey_ms']} ms")
+        signals.finished.emit()
+
+    def run_transform_benchmark(signals,*args,**kwargs):
+        """Micro-benchmark of the block transform plan on every engine, runs in the background thread."""
+        signals.update_terminal.emit("Running block transform benchmark...")
+        for engine_name in backends.available_backends():
+            result = bench.block_transform(engine=engine_name)
+            signals.update_terminal.emit(f"Engine: {engine_name}")
+            signals.update_terminal.emit(f"  Plan setup: {result['plan_setup_ms']} ms")
+            signals.update_terminal.emit(f"  Encryption: {result['encrypt_ms_per_block']} ms per block")
+            signals.update_terminal.emit(f"  Decryption: {result['decrypt_ms_per_block']} ms per block")
+        signals.finished.emit()
+
+    def run_io_benchmark(signals,*args,**kwargs):
+        """Buffered against direct I/O throughput, runs in the background thread."""
+        signals.update_terminal.emit("Running I/O mode benchmark on a 64MB test file...")
+        pref = utils.load_config().get("preferences")
+        results = bench.io_modes(os.path.abspath("./assets"), cores=pref.get("cores"))
+        for mode, result in results.items():
+            signals.update_terminal.emit(f"{mode.capitalize()} I/O: encrypt {result['encrypt_mb_per_s']} MB/s, "
+                                         f"decrypt {result['decrypt_mb_per_s']} MB/s")
+        signals.finished.emit()
+
     def run_benchmark(signals,*args,**kwargs):
         """Function that runs in the background thread."""
         config = utils.load_config()
         benchmarks = config["benchmarks"]
+        pref = config.get("preferences")
+        executor = pref.get("executor", "thread")
+        engine = engine_override if isinstance(engine_override, str) else pref.get("engine", backends.DEFAULT_BACKEND)
+        if engine not in backends.available_backends():
+            return signals.update_terminal.emit(f"Invalid engine '{engine}'. Available options: {', '.join(backends.available_backends())}")
         try:
             ncores = int(cores) if cores else utils.get_default_core_count()
             if min_cores <= ncores <= max_cores:
@@ -614,7 +889,7 @@ def benchmark(app, cores=None, *args, **kwargs):
         if ncores not in range(min_cores, max_cores + 1):
             return signals.update_terminal.emit(f"Invalid cores range. ({min_cores},{max_cores})")
 
-        signals.update_terminal.emit(f"Running benchmark with {ncores} cores...")
+        signals.update_terminal.emit(f"Running benchmark with {ncores} cores using the '{engine}' engine ({executor} executor)...")
         # === Step 1: Generate 100MB Test File ===
         test_file = os.path.abspath("./assets/benchmark_testfile.bin")
         output_file = os.path.abspath("./assets/benchmark_output.enc")
@@ -624,14 +899,27 @@ def benchmark(app, cores=None, *args, **kwargs):
                 f.write(os.urandom(100 * 1024 * 1024))
         signals.update_terminal.emit("Starting encryption process...")
         # === Step 2: Measure Encryption Time ===
+        # Subkeys cached by an earlier benchmark in this session would skip their derivation
+        subkey_cache.shared_cache.clear()
         start_time = time.time()
         key = "testing@123".encode()
-        encryptor.encrypt_file(test_file, output_file, key, cores=ncores)
+        queue_depth = pref.get("queue_depth", PIPELINE_QUEUE_DEPTH)
+        pipeline = encryptor.encrypt_file(test_file, output_file, key, cores=ncores, executor=executor, engine=engine,
+                                          queue_depth=queue_depth, direct_io=pref.get("direct_io", False))
         end_time = time.time()
         time_taken = end_time - start_time
         signals.update_terminal.emit("Benchmark completed!")
         signals.update_terminal.emit(f"Encryption Time: {time_taken:.4f} seconds")
+        if pipeline:
+            signals.update_terminal.emit(f"Bottleneck stage: {pipeline['bottleneck']}")
         benchmarks[str(ncores)] = round(time_taken,6)
+        utils.log_benchmark(config, {
+            "cores": ncores,
+            "executor": executor,
+            "engine": engine,
+            "seconds": round(time_taken,6),
+            "subkey_cache_hits": subkey_cache.shared_cache.stats()["hits"],
+        })
         # Sort benchmarks dictionary by numerical key order before saving
         sorted_benchmarks = {str(k): benchmarks[str(k)] for k in sorted(map(int, benchmarks.keys()))}
         config["benchmarks"] = sorted_benchmarks
@@ -643,7 +931,14 @@ def benchmark(app, cores=None, *args, **kwargs):
         signals.finished.emit()
 
     # === Step 3: Create Worker and Start It ===
-    worker = ParallelWorker(run_benchmark)
+    if kwargs.get("subkey"):
+        worker = ParallelWorker(run_subkey_benchmark)
+    elif kwargs.get("transform"):
+        worker = ParallelWorker(run_transform_benchmark)
+    elif kwargs.get("io"):
+        worker = ParallelWorker(run_io_benchmark)
+    else:
+        worker = ParallelWorker(run_benchmark)
     app.retro_terminal.connect_worker_signals(worker)
     QThreadPool.globalInstance().start(worker)
 
@@ -654,13 +949,29 @@ def show_info(app,*args,**kwargs):
     cores = kwargs.get("cores") or kwargs.get("core") or kwargs.get("cpus") or kwargs.get("cpu")
     version = kwargs.get("version") or kwargs.get("ver") or kwargs.get("v")
     cfg = kwargs.get("config") or kwargs.get("cfg")
-    if not (cores or version or cfg):
+    cache = kwargs.get("cache")
+    pipeline = kwargs.get("pipeline")
+    if not (cores or version or cfg or cache or pipeline):
         return app.retro_terminal.type_text(get_help_text('info'))
     if cores:
         cores = pref.get("cores")
         app.retro_terminal.type_text(f"Enigmatrix encryption/decryption is using {cores} cores of your cpu.")
     if version:
         app.retro_terminal.type_text(f"Current Enigmatrix version is : {VERSION}")
+    if cache:
+        stats = subkey_cache.shared_cache.stats()
+        app.retro_terminal.type_text(f"Subkey cache: {stats['entries']} subkeys, {stats['size_mb']} of {stats['budget_mb']} MB")
+        app.retro_terminal.type_text(f"Hits: {stats['hits']}, Misses: {stats['misses']}, Hit rate: {stats['hit_rate'] * 100:.1f}%")
+    if pipeline:
+        stats = encryptor.last_pipeline_stats
+        if not stats:
+            app.retro_terminal.type_text("No pipelined encryption/decryption has run in this session.")
+        else:
+            app.retro_terminal.type_text(f"Last run: {stats['batch_size']} blocks per batch, bottleneck stage: {stats['bottleneck']}")
+            for name, occupancy in stats["queues"].items():
+                app.retro_terminal.type_text(f"{name}: mean {occupancy['mean']}, max {occupancy['max']} of {occupancy['depth']} batches")
+            for stage in stats["starved_s"]:
+                app.retro_terminal.type_text(f"{stage}: {stats['busy_s'][stage]}s busy, {stats['starved_s'][stage]}s waiting for input, {stats['blocked_s'][stage]}s waiting on output")
     if cfg:
         t_config = config.copy()
         t_config.pop("command_history",None)
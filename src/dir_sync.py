@@ -0,0 +1,196 @@
+"""
+Encrypted directory mirrors.
+`sync_directory` encrypts every file under a source directory to the same relative path
+under a target directory, with `ENCRYPTED_SUFFIX` appended. An index in the target records,
+for each source file, its size, modification time, keyed content digest and ciphertext path:
+- files whose size and modification time match the index are skipped without being read,
+- files whose content matches a file that disappeared are renames, and their ciphertext is
+  moved rather than re-encrypted; a ciphertext only depends on the content and the key,
+- ciphertexts of files that disappeared are deleted.
+An unchanged tree costs one `stat` per file and per ciphertext.
+"""
+import hashlib
+import json
+import os
+import time
+import session
+import manifest
+from cfg import *
+
+INDEX_VERSION = 1
+
+
+def index_path(target_dir):
+    return os.path.join(target_dir, SYNC_INDEX_FILE)
+
+
+def key_fingerprint(plan, public_key):
+    """Identifies the key, subkey engine and RSA public key a mirror is encrypted with."""
+    rsa = hashlib.sha256(public_key.export_key()).hexdigest() if public_key else None
+    return {"key_check": manifest.key_check(plan), "rsa": rsa}
+
+
+def load_index(target_dir, fingerprint):
+    """
+    Returns the index entries of a mirror, keyed by source path relative to the source directory.
+    Entries written with another key are kept, so their ciphertexts are still tracked, but never
+    match a file, so every file is encrypted again.
+    """
+    try:
+        with open(index_path(target_dir)) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if index.get("version") != INDEX_VERSION:
+        return {}
+    files = index.get("files", {})
+    if any(index.get(name) != value for name, value in fingerprint.items()):
+        for entry in files.values():
+            entry["mtime_ns"] = entry["digest"] = None
+    return files
+
+
+def save_index(target_dir, fingerprint, files):
+    path = index_path(target_dir)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"version": INDEX_VERSION, **fingerprint, "files": files}, f)
+    os.replace(path + ".tmp", path)
+
+
+def scan_tree(root, skip=None):
+    """Returns `{relative path: (size, mtime_ns)}` of the files under `root`, leaving out the `skip` directory."""
+    files = {}
+    stack = [(root, "")]
+    while stack:
+        directory, prefix = stack.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                rel = prefix + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.path != skip:
+                        stack.append((entry.path, rel + "/"))
+                elif entry.is_file():
+                    stat = entry.stat()
+                    files[rel] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+def file_digest(path, key):
+    """Keyed digest of a file's content, read in 1MB blocks."""
+    digest = hashlib.blake2b(digest_size=MANIFEST_DIGEST_SIZE, key=key, person=b"enigmatrix-file")
+    with open(path, "rb") as f:
+        while block := f.read(BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def prune_empty_dirs(target_dir, path):
+    """Deletes the directories above `path` left empty, up to but not including `target_dir`."""
+    directory = os.path.dirname(path)
+    while os.path.abspath(directory) != os.path.abspath(target_dir):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            break
+        directory = os.path.dirname(directory)
+
+
+def remove_file(target_dir, rel):
+    """Deletes a ciphertext and its delta manifest, then the directories it leaves empty."""
+    path = os.path.join(target_dir, rel)
+    for name in (path, manifest.manifest_path(path)):
+        if os.path.exists(name):
+            os.remove(name)
+    prune_empty_dirs(target_dir, path)
+
+
+def move_file(target_dir, old_rel, new_rel):
+    """Moves a ciphertext and its delta manifest, then deletes the directories it leaves empty."""
+    old_path = os.path.join(target_dir, old_rel)
+    new_path = os.path.join(target_dir, new_rel)
+    os.makedirs(os.path.dirname(new_path), exist_ok=True)
+    os.replace(old_path, new_path)
+    if os.path.exists(manifest.manifest_path(old_path)):
+        os.replace(manifest.manifest_path(old_path), manifest.manifest_path(new_path))
+    elif os.path.exists(manifest.manifest_path(new_path)):
+        # A stale manifest of an earlier file at the new path would not describe this ciphertext
+        os.remove(manifest.manifest_path(new_path))
+    prune_empty_dirs(target_dir, old_path)
+
+
+def sync_directory(source_dir, target_dir, raw_key, public_key=None, cores=None, engine=None,
+                   subkey_engine=DEFAULT_SUBKEY_ENGINE, queue_depth=PIPELINE_QUEUE_DEPTH, direct_io=False,
+                   full=False, signals=None):
+    """
+    Brings the encrypted mirror of `source_dir` in `target_dir` up to date and returns counts
+    of the files left `unchanged`, `encrypted`, `moved` and `deleted`. `full` encrypts every
+    file again and leaves the ciphertexts of files that disappeared in place; only a sync,
+    without `full`, moves or deletes them. Files are encrypted one after another on one session, sharing its plan and
+    compute threads. The index is saved even when a file fails, so finished work is kept.
+    """
+    source_dir = os.path.abspath(source_dir)
+    target_dir = os.path.abspath(target_dir)
+    if source_dir == target_dir:
+        raise ValueError("Source and target directories cannot be same")
+    if not os.path.isdir(source_dir):
+        raise ValueError(f"No such directory exists: \"{source_dir}\"")
+    os.makedirs(target_dir, exist_ok=True)
+    start_time = time.perf_counter()
+    if signals:
+        signals.time1.emit()
+    counts = {"unchanged": 0, "encrypted": 0, "moved": 0, "deleted": 0}
+
+    def report(action, text):
+        counts[action] += 1
+        if signals:
+            signals.update_terminal.emit(f"{action.capitalize()}: {text}\n")
+
+    with session.Enigmatrix(raw_key, public_key, cores=cores, engine=engine, subkey_engine=subkey_engine,
+                            queue_depth=queue_depth, direct_io=direct_io) as enigmatrix:
+        fingerprint = key_fingerprint(enigmatrix.plan, public_key)
+        digest_key = manifest.digest_key(enigmatrix.plan)
+        index = load_index(target_dir, fingerprint)
+        if full:
+            for entry in index.values():
+                entry["mtime_ns"] = entry["digest"] = None
+        files = scan_tree(source_dir, skip=target_dir)
+        # Ciphertexts of files that disappeared, by content, for rename detection
+        orphans = {}
+        for rel, entry in index.items():
+            if rel not in files and entry["digest"]:
+                orphans.setdefault((entry["size"], entry["digest"]), []).append(rel)
+
+        try:
+            for n, (rel, (size, mtime_ns)) in enumerate(sorted(files.items())):
+                if signals:
+                    signals.progress_update.emit(n * 100 // len(files))
+                output = rel + ENCRYPTED_SUFFIX
+                output_path = os.path.join(target_dir, output)
+                entry = index.get(rel)
+                if entry and (entry["size"], entry["mtime_ns"]) == (size, mtime_ns) and os.path.isfile(output_path):
+                    counts["unchanged"] += 1
+                    continue
+                digest = file_digest(os.path.join(source_dir, rel), digest_key)
+                renamed = orphans.get((size, digest))
+                if entry and entry["digest"] == digest and os.path.isfile(output_path):
+                    # Touched but not modified
+                    counts["unchanged"] += 1
+                elif renamed and os.path.isfile(os.path.join(target_dir, index[renamed[-1]]["output"])):
+                    old_rel = renamed.pop()
+                    move_file(target_dir, index.pop(old_rel)["output"], output)
+                    report("moved", f"\"{old_rel}\" -> \"{rel}\"")
+                else:
+                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                    enigmatrix.encrypt_file(os.path.join(source_dir, rel), output_path)
+                    report("encrypted", f"\"{rel}\"")
+                index[rel] = {"size": size, "mtime_ns": mtime_ns, "digest": digest, "output": output}
+            if not full:
+                for rel in [rel for rel in index if rel not in files]:
+                    remove_file(target_dir, index.pop(rel)["output"])
+                    report("deleted", f"\"{rel}\"")
+        finally:
+            save_index(target_dir, fingerprint, index)
+    if signals:
+        signals.time2.emit()
+        signals.progress_update.emit(100)
+    return {**counts, "files": len(files), "seconds": round(time.perf_counter() - start_time, 6)}
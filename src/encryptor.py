@@ -2,187 +2,1065 @@ import utils
 import numpy as np
 import key_utils
 import random
-import gc
+import os
+import itertools
+import importlib
+import importlib.util
 import threading
-from concurrent.futures import ThreadPoolExecutor
+import queue
+import time
+import multiprocessing
+import multiprocessing.util
+from concurrent.futures import ProcessPoolExecutor
 import concurrent.futures
+import backends
+import subkey_cache
+import manifest
+from collections import OrderedDict
+from contextlib import contextmanager
 from cfg import *
 
+# numba is optional, the "numba" engine is only registered when it is installed.
+# Its kernels are imported on first use, so importing this module stays fast.
+HAS_NUMBA = importlib.util.find_spec("numba") is not None
+
 
 OPERATIONS = ["permutation", "xor", "modular"]
 MOD_ORDER = ["add", "sub"]
 PERMUTATION_ORDER = ["row", "column"]
 
 
-def encrypt_file(input_path, output_path, raw_key, public_key=None, cores=None, signals=None):
-    """Encrypts a file using memory-efficient multi-threading with deterministic subkeys."""
+def prepare_encryption(input_path, output_path, rsa_enc_key, subkey_engine):
+    """
+    Writes the header of a new encrypted file for `input_path` and reserves its blocks.
+    Returns the plaintext size, the number of blocks, the last block size and the header size.
+    """
     file_size, num_blocks, last_block_size = utils.file_info(input_path)
+    header_size = utils.write_file_header(output_path, last_block_size, rsa_enc_key, subkey_engine)
+    utils.preallocate_file(output_path, header_size + num_blocks * BLOCK_SIZE)
+    return file_size, num_blocks, last_block_size, header_size
+
+
+def prepare_decryption(input_path, output_path, header):
+    """
+    Creates the plaintext output of the encrypted file `input_path`, with its parsed `header`,
+    and reserves its size. Returns the plaintext size and the number of blocks.
+    """
+    num_blocks = utils.calculate_num_blocks(os.path.getsize(input_path) - header["trailer_size"],
+                                            header["header_size"])
+    size = utils.plaintext_size(header, num_blocks)
+    with open(output_path, "wb"):
+        pass
+    utils.preallocate_file(output_path, size)
+    return size, num_blocks
+
 
+def open_encryption_files(input_path, output_path, header_size, direct_io=False):
+    """Opens the input blocks and the prepared output of an encryption, as a `(BlockReader, BlockWriter)` pair."""
+    blocks = utils.BlockReader(input_path, 0, direct_io)
+    try:
+        return blocks, utils.BlockWriter(output_path, header_size, direct_io)
+    except BaseException:
+        blocks.close()
+        raise
+
+
+def open_decryption_files(input_path, output_path, header, direct_io=False):
+    """Opens the encrypted blocks and the prepared output of a decryption, as a `(BlockReader, BlockWriter)` pair."""
+    blocks = utils.BlockReader(input_path, header["header_size"], direct_io, header["trailer_size"])
+    try:
+        return blocks, utils.BlockWriter(output_path, 0, direct_io)
+    except BaseException:
+        blocks.close()
+        raise
+
+
+def encrypt_file(input_path, output_path, raw_key, public_key=None, cores=None, executor="thread", engine=None,
+                 subkey_engine=DEFAULT_SUBKEY_ENGINE, queue_depth=PIPELINE_QUEUE_DEPTH, direct_io=False, signals=None,
+                 write_manifest=False):
+    """
+    Encrypts a file using memory-efficient multi-threading with deterministic subkeys.
+    `direct_io` keeps the input and output out of the page cache.
+    `write_manifest` hashes every plaintext block as it is encrypted and writes the digests
+    to a sidecar manifest for `delta_encrypt_file`; it always runs on the thread pipeline.
+    With the thread executor, returns the pipeline stage statistics of the run.
+    """
     if signals:
         signals.time1.emit()
         signals.update_terminal.emit(f"Using {cores} cpu cores.\n")
 
-    primary_hash = key_utils.primary_hash(raw_key)
-    seed1, seed2 = key_utils.extract_prng_seeds(primary_hash)
+    rsa_enc_key = key_utils.rsa_encrypt_key(raw_key, public_key) if public_key else None
+    file_size, num_blocks, last_block_size, header_size = prepare_encryption(input_path, output_path, rsa_enc_key,
+                                                                             subkey_engine)
 
+    backend = backends.get_backend(engine)
+    if executor == "process" and not write_manifest:
+        job = {
+            "raw_key": raw_key,
+            "decrypt": False,
+            "engine": backend.name,
+            "subkey_engine": subkey_engine,
+            "num_blocks": num_blocks,
+            "last_block_size": last_block_size,
+            "input_path": input_path,
+            "pointer": 0,
+            "trailer": 0,
+            "output_path": output_path,
+            "header_size": header_size,
+            "direct_io": direct_io,
+        }
+        run_in_processes(job, cores, num_blocks, signals)
+    else:
+        plan = get_plan(raw_key, subkey_engine)
+        blocks, writer = open_encryption_files(input_path, output_path, header_size, direct_io)
+        with blocks, writer:
+            if not write_manifest:
+                return encrypt_blocks(plan, blocks, writer, backend, cores, signals, queue_depth)
+            digests = [None] * num_blocks
+            compute, write = block_stages(plan, writer, False, backend, num_blocks)
+            compute = digest_stage(compute, digests, manifest.digest_key(plan))
+            pipeline = run_pipeline(blocks, compute, write, cores, num_blocks, signals, queue_depth)
+        manifest.write_manifest(output_path, plan, file_size, digests)
+        return pipeline
+
+
+def delta_encrypt_file(input_path, output_path, raw_key, public_key=None, cores=None, executor="thread", engine=None,
+                       subkey_engine=DEFAULT_SUBKEY_ENGINE, queue_depth=PIPELINE_QUEUE_DEPTH, direct_io=False,
+                       signals=None):
+    """
+    Re-encrypts a file over its previous encryption at `output_path`, using the sidecar manifest
+    written with it. Every plaintext block is hashed in parallel, and only blocks whose digest
+    changed are encrypted and written in place; the file is cut or extended to the new size.
+    The header is kept, except that with `public_key` the key is wrapped again and the RSA-encrypted
+    key replaced, so a new recipient takes effect. Without a usable manifest for this key and subkey
+    engine, or when the RSA use, RSA key size or format differs, the file is encrypted in full.
+    Runs on the thread pipeline and writes a new manifest either way. Returns the pipeline stage
+    statistics, with the number of `changed_blocks`.
+    """
+    plan = get_plan(raw_key, subkey_engine)
+    old_digests = manifest.load_manifest(output_path, plan) if os.path.isfile(output_path) else None
+    header = utils.read_header(output_path) if old_digests is not None else None
+    # OAEP wrapping is randomized, so the recipient cannot be compared; the key is always wrapped again
     rsa_enc_key = key_utils.rsa_encrypt_key(raw_key, public_key) if public_key else None
-    utils.write_file_header(output_path, last_block_size, rsa_enc_key)
+    if (header is None or header["stream"] or header["rsa_flag"] != bool(public_key)
+            or (rsa_enc_key and len(rsa_enc_key) != len(header["rsa_enc_key"]))):
+        pipeline = encrypt_file(input_path, output_path, raw_key, public_key, cores, executor, engine, subkey_engine,
+                                queue_depth, direct_io, signals, write_manifest=True)
+        pipeline["changed_blocks"] = utils.file_info(input_path)[1]
+        return pipeline
 
-    op_order = determine_operation_sequence(seed1)
-    row_swaps, col_swaps, permutation_order, mod_order = determine_sub_operations(seed2)
+    file_size, num_blocks, last_block_size = utils.file_info(input_path)
+    header_size = header["header_size"]
 
-    processed_blocks = 0
-    progress_lock = threading.Lock()
+    if signals:
+        signals.time1.emit()
+        signals.update_terminal.emit(f"Using {cores} cpu cores.\n")
 
-    def process_block(i, block):
-        block = utils.pad_block(block)
-        block_matrix = utils.bytes_to_matrix(block)
+    # Blocks past the new end are cut off, new blocks are reserved
+    with open(output_path, "r+b") as f:
+        f.truncate(header_size + num_blocks * BLOCK_SIZE)
+    utils.preallocate_file(output_path, header_size + num_blocks * BLOCK_SIZE)
+    digests = [None] * num_blocks
+    backend = backends.get_backend(engine)
+    blocks, writer = open_encryption_files(input_path, output_path, header_size, direct_io)
+    with blocks, writer:
+        compute, write = delta_stages(plan, writer, backend, old_digests, digests)
+        pipeline = run_pipeline(blocks, compute, write, cores, num_blocks, signals, queue_depth)
+    if rsa_enc_key:
+        utils.write_rsa_enc_key(output_path, header, rsa_enc_key)
+    utils.write_last_block_size(output_path, header, num_blocks, last_block_size)
+    manifest.write_manifest(output_path, plan, file_size, digests)
+    pipeline["changed_blocks"] = sum(i >= len(old_digests) or digest != old_digests[i]
+                                     for i, digest in enumerate(digests))
+    return pipeline
 
-        # 🔑 Deterministic, index-based subkey derivation
-        subkey = key_utils.derive_subkey(primary_hash, raw_key, i)
-        subkey_matrix = utils.bytes_to_matrix(subkey)
 
-        for op in op_order:
-            if op == "xor":
-                block_matrix = apply_xor(block_matrix, subkey_matrix)
-            elif op == "modular":
-                for t, mod_op in enumerate(mod_order):
-                    block_matrix = apply_modular_operations(block_matrix, subkey_matrix, mod_op, t == 1)
-            elif op == "permutation":
-                block_matrix = apply_permutation(block_matrix, row_swaps, col_swaps, permutation_order)
+def decrypt_file(input_path, output_path, raw_key=None, private_key=None, cores=None, executor="thread", engine=None,
+                 queue_depth=PIPELINE_QUEUE_DEPTH, direct_io=False, signals=None):
+    """
+    Decrypts a file encrypted with Enigmatrix using deterministic subkeys.
+    `direct_io` keeps the input and output out of the page cache.
+    With the thread executor, returns the pipeline stage statistics of the run.
+    """
+    header = utils.read_header(input_path)
+    last_block_size = utils.header_last_block_size(header)
+    subkey_engine = header["subkey_engine"]
+    raw_key = header_key(header, raw_key, private_key)
+
+    if signals:
+        signals.time1.emit()
+        signals.update_terminal.emit(f"Using {cores} cpu cores.\n")
+
+    header_size = header["header_size"]
+    _, num_blocks = prepare_decryption(input_path, output_path, header)
+
+    backend = backends.get_backend(engine)
+    if executor == "process":
+        job = {
+            "raw_key": raw_key,
+            "decrypt": True,
+            "engine": backend.name,
+            "subkey_engine": subkey_engine,
+            "num_blocks": num_blocks,
+            "last_block_size": last_block_size,
+            "input_path": input_path,
+            "pointer": header_size,
+            "trailer": header["trailer_size"],
+            "output_path": output_path,
+            "header_size": 0,
+            "direct_io": direct_io,
+        }
+        run_in_processes(job, cores, num_blocks, signals)
+    else:
+        plan = get_plan(raw_key, subkey_engine)
+        blocks, writer = open_decryption_files(input_path, output_path, header, direct_io)
+        with blocks, writer:
+            return decrypt_blocks(plan, blocks, writer, last_block_size, backend, cores, signals, queue_depth)
+
+
+def append_file(input_path, output_path, raw_key=None, private_key=None, cores=None, engine=None,
+                queue_depth=PIPELINE_QUEUE_DEPTH, direct_io=False, signals=None):
+    """
+    Appends the contents of `input_path` to the encrypted file `output_path` in place.
+    Blocks are index-keyed, so only a partial last block is decrypted, merged with the start
+    of the input and re-encrypted; the rest of the input is encrypted into new blocks after it.
+    The work is proportional to the appended bytes, not to the size of the encrypted file.
+    The file keeps its key, RSA-encrypted key, subkey engine and format. Returns the pipeline
+    stage statistics.
+    The new blocks are written first, then the merged block, whose plaintext starts with the
+    old tail, and the last block size last. Appending is still not crash-safe: an interrupted
+    append leaves a file that decrypts to the old contents followed by the new data cut short
+    or zero-padded to the old last block size, and a streaming-format file without a valid
+    trailer. Keep a copy if that matters.
+    """
+    header = utils.read_header(output_path)
+    plan = get_plan(header_key(header, raw_key, private_key), header["subkey_engine"])
+    backend = backends.get_backend(engine)
+    header_size = header["header_size"]
+    num_blocks = utils.calculate_num_blocks(utils.file_info(output_path)[0] - header["trailer_size"], header_size)
+    # Plaintext bytes of a partial last block, 0 when the last block is full or there are no blocks
+    tail_size = header["last_block_size"] if num_blocks else 0
+    first_block = num_blocks - 1 if tail_size else num_blocks
+    append_size = utils.file_info(input_path)[0]
+    _, total_blocks, last_block_size = utils.size_info(first_block * BLOCK_SIZE + tail_size + append_size)
+
+    if signals:
+        signals.time1.emit()
+        signals.update_terminal.emit(f"Using {cores} cpu cores.\n")
+
+    # The input continues where the merged block ends
+    head_size = BLOCK_SIZE - tail_size if tail_size else 0
+    merged = None
+    if tail_size:
+        # Read before the file grows, while the old blocks and trailer are where the header says
+        with utils.BlockReader(output_path, header_size, trailer=header["trailer_size"]) as old_blocks:
+            tail = plan.decrypt_block(first_block, old_blocks.block(first_block), backend)[:tail_size]
+        with open(input_path, "rb") as f:
+            head = f.read(head_size)
+        merged = plan.encrypt_block(first_block, tail + head, backend)
+
+    utils.preallocate_file(output_path, header_size + total_blocks * BLOCK_SIZE + header["trailer_size"])
+    with utils.BlockReader(input_path, head_size, direct_io) as blocks, \
+            utils.BlockWriter(output_path, header_size, direct_io) as writer:
+        pipeline = encrypt_blocks(plan, blocks, writer, backend, cores, signals, queue_depth,
+                                  first_block=first_block + (tail_size > 0))
+        # The merged block decrypts to the old tail under the old last block size, so
+        # overwriting it only after the new blocks keeps the old contents readable longest
+        if merged is not None:
+            writer.write_block(first_block, merged)
+    # The new size is recorded once every block is written
+    utils.write_last_block_size(output_path, header, total_blocks, last_block_size)
+    return pipeline
+
+
+def encrypt_bytes(data, raw_key, public_key=None, cores=None, engine=None, subkey_engine=DEFAULT_SUBKEY_ENGINE,
+                  queue_depth=PIPELINE_QUEUE_DEPTH):
+    """Encrypts a bytes-like object in memory on the block pipeline and returns the encrypted file contents."""
+    rsa_enc_key = key_utils.rsa_encrypt_key(raw_key, public_key) if public_key else None
+    output, _ = encrypt_buffer(get_plan(raw_key, subkey_engine), data, rsa_enc_key, backends.get_backend(engine),
+                               cores, queue_depth)
+    return bytes(output)
+
+
+def decrypt_bytes(data, raw_key=None, private_key=None, cores=None, engine=None, queue_depth=PIPELINE_QUEUE_DEPTH):
+    """Decrypts the contents of an encrypted file held in memory and returns the plaintext."""
+    header = utils.parse_buffer_header(data)
+    plan = get_plan(header_key(header, raw_key, private_key), header["subkey_engine"])
+    output, _ = decrypt_buffer(plan, data, header, backends.get_backend(engine), cores, queue_depth)
+    return bytes(output)
+
+
+def encrypt_buffer(plan, data, rsa_enc_key, backend, cores, queue_depth=PIPELINE_QUEUE_DEPTH, pool=None):
+    """
+    Encrypts a bytes-like object with `plan` into a new bytearray holding the encrypted file.
+    Blocks are read from and written to memory directly. Returns the bytearray and the pipeline statistics.
+    """
+    size, num_blocks, last_block_size = utils.size_info(memoryview(data).nbytes)
+    header = utils.pack_header(last_block_size, rsa_enc_key, plan.subkey_engine)
+    output = bytearray(len(header) + num_blocks * BLOCK_SIZE)
+    output[:len(header)] = header
+    with utils.BufferReader(data) as blocks, utils.BufferWriter(output, len(header)) as writer:
+        pipeline = encrypt_blocks(plan, blocks, writer, backend, cores, None, queue_depth, pool)
+    return output, pipeline
+
 
-        result = utils.matrix_to_bytes(block_matrix)
-        del block_matrix, subkey_matrix
+def decrypt_buffer(plan, data, header, backend, cores, queue_depth=PIPELINE_QUEUE_DEPTH, pool=None):
+    """
+    Decrypts an encrypted file held in memory, with its parsed `header`, into a new bytearray.
+    Returns the bytearray and the pipeline statistics.
+    """
+    with utils.BufferReader(data, header["header_size"], header["trailer_size"]) as blocks:
+        output = bytearray(utils.plaintext_size(header, len(blocks)))
+        with utils.BufferWriter(output) as writer:
+            pipeline = decrypt_blocks(plan, blocks, writer, utils.header_last_block_size(header), backend, cores, None, queue_depth, pool)
+    return output, pipeline
+
+
+def encrypt_stream(input_stream, output_stream, raw_key, public_key=None, cores=None, engine=None,
+                   subkey_engine=DEFAULT_SUBKEY_ENGINE, queue_depth=PIPELINE_QUEUE_DEPTH):
+    """
+    Encrypts an unseekable binary stream of unknown length, e.g. stdin, in the streaming
+    format: a header without the last block size, the blocks in order and the last block
+    size as a trailer. Memory use is bounded by the blocks in flight.
+    Returns the pipeline stage statistics.
+    """
+    rsa_enc_key = key_utils.rsa_encrypt_key(raw_key, public_key) if public_key else None
+    output_stream.write(utils.pack_header(None, rsa_enc_key, subkey_engine))
+    plan = get_plan(raw_key, subkey_engine)
+    backend = backends.get_backend(engine)
+    with utils.StreamReader(input_stream) as blocks, utils.StreamWriter(output_stream) as writer:
+        compute, write = block_stages(plan, writer, False, backend, None)
+        # Single-block batches keep the memory in flight and the latency per block low
+        pipeline = run_pipeline(blocks, compute, write, cores, None, None, queue_depth, ordered=True, batch_size=1)
+    output_stream.write(utils.pack_trailer(blocks.size % BLOCK_SIZE))
+    output_stream.flush()
+    return pipeline
+
+
+def decrypt_stream(input_stream, output_stream, raw_key=None, private_key=None, cores=None, engine=None,
+                   queue_depth=PIPELINE_QUEUE_DEPTH):
+    """
+    Decrypts an unseekable binary stream, e.g. stdin, in the streaming or the file format.
+    Each block is written to `output_stream` as soon as it and the blocks before it are
+    decrypted. Returns the pipeline stage statistics.
+    """
+    header = utils.parse_header(input_stream)
+    raw_key = header_key(header, raw_key, private_key)
+    plan = get_plan(raw_key, header["subkey_engine"])
+    backend = backends.get_backend(engine)
+    with utils.StreamReader(input_stream, header["trailer_size"]) as blocks, \
+            utils.StreamWriter(output_stream) as writer:
+
+        def compute(start, count, scratch):
+            return plan.transform(start, count, True, backend, scratch)
+
+        def write(start, work):
+            # The reader knows the last block and reads the trailer before handing it over
+            for n, matrix in enumerate(work):
+                if blocks.num_blocks is None or start + n < blocks.num_blocks - 1:
+                    writer.write_block(start + n, matrix)
+                    continue
+                last_block_size = utils.unpack_trailer(blocks.trailer) if header["stream"] else header["last_block_size"]
+                write_result(writer, start + n, matrix, blocks.num_blocks, last_block_size or BLOCK_SIZE)
+
+        return run_pipeline(blocks, compute, write, cores, None, None, queue_depth, ordered=True, batch_size=1)
+
+
+def block_stages(plan, writer, decrypt, backend, num_blocks, last_block_size=BLOCK_SIZE, first_block=0):
+    """
+    Returns the `compute(start, count, scratch)` and `write(start, work)` stages of a job
+    that transforms blocks with `plan` and writes them to a block writer, truncating the
+    last decrypted block. Block `i` of the reader is block `first_block + i` of the file.
+    """
+    def compute(start, count, scratch):
+        return plan.transform(first_block + start, count, decrypt, backend, scratch)
+
+    def write(start, work):
+        for n, matrix in enumerate(work):
+            if decrypt:
+                write_result(writer, start + n, matrix, num_blocks, last_block_size)
+            else:
+                writer.write_block(first_block + start + n, matrix)
+
+    return compute, write
+
+
+def digest_stage(compute, digests, key):
+    """Wraps a compute stage to record the manifest digest of every plaintext block before it is transformed."""
+    def hashed(start, count, scratch):
+        for n in range(count):
+            digests[start + n] = manifest.block_digest(scratch["block"][n], key)
+        return compute(start, count, scratch)
+
+    return hashed
+
+
+def delta_stages(plan, writer, backend, old_digests, digests):
+    """
+    Returns the compute and write stages of a delta re-encryption. Compute hashes each block
+    into `digests`, then moves the changed blocks to the front of the batch and encrypts only
+    those. Its result holds None for unchanged blocks, which are not written.
+    """
+    key = manifest.digest_key(plan)
+
+    def compute(start, count, scratch):
+        stack = scratch["block"]
+        changed = []
+        for n in range(count):
+            i = start + n
+            digests[i] = manifest.block_digest(stack[n], key)
+            if i >= len(old_digests) or digests[i] != old_digests[i]:
+                changed.append(n)
+        result = [None] * count
+        if not changed:
+            return result
+        for k, n in enumerate(changed):
+            if k != n:
+                stack[k] = stack[n]
+        work = plan.transform(start, len(changed), False, backend, scratch, [start + n for n in changed])
+        for k, n in enumerate(changed):
+            result[n] = work[k]
         return result
 
-    with ThreadPoolExecutor(max_workers=cores) as executor:
-        block_iterator = enumerate(utils.read_file_in_blocks(input_path))
-        futures = set()
-        future_to_block = {}
+    def write(start, work):
+        for n, matrix in enumerate(work):
+            if matrix is not None:
+                writer.write_block(start + n, matrix)
 
-        for _ in range(cores):
-            try:
-                i, block = next(block_iterator)
-                future = executor.submit(process_block, i, block)
-                futures.add(future)
-                future_to_block[future] = i
-            except StopIteration:
-                break
+    return compute, write
 
-        next_index = 0
-        results = {}
 
-        while futures:
-            done, futures = concurrent.futures.wait(
-                futures, return_when=concurrent.futures.FIRST_COMPLETED
-            )
+def encrypt_blocks(plan, blocks, writer, backend, cores, signals=None, queue_depth=PIPELINE_QUEUE_DEPTH, pool=None,
+                   first_block=0):
+    """
+    Encrypts every block of a `utils.BlockReader` or `utils.BufferReader` into a block writer
+    through `run_pipeline`, as blocks `first_block, first_block + 1, ...` of the encrypted file.
+    Returns the pipeline stage statistics.
+    """
+    compute, write = block_stages(plan, writer, False, backend, len(blocks), first_block=first_block)
+    return run_pipeline(blocks, compute, write, cores, len(blocks), signals, queue_depth, pool)
 
-            for future in done:
-                i = future_to_block[future]
-                results[i] = future.result()
-                del future_to_block[future]
-
-                while next_index in results:
-                    utils.write_to_file(output_path, results[next_index])
-                    del results[next_index]
-                    next_index += 1
-
-                    if signals:
-                        with progress_lock:
-                            processed_blocks += 1
-                            progress_percent = int((processed_blocks / num_blocks) * 100)
-                            if processed_blocks == num_blocks:
-                                signals.time2.emit()
-                            signals.progress_update.emit(progress_percent)
-                            signals.nblock_update.emit(processed_blocks, num_blocks)
-                            signals.terminal_progress.emit(processed_blocks, num_blocks)
-
-                try:
-                    i, block = next(block_iterator)
-                    new_future = executor.submit(process_block, i, block)
-                    futures.add(new_future)
-                    future_to_block[new_future] = i
-                except StopIteration:
-                    pass
-
-    gc.collect()
-
-
-def decrypt_file(input_path, output_path, raw_key=None, private_key=None, cores=None, signals=None):
-    """Decrypts a file encrypted with Enigmatrix using deterministic subkeys."""
 
-    with open(output_path, "wb"):
-        pass
+def decrypt_blocks(plan, blocks, writer, last_block_size, backend, cores, signals=None,
+                   queue_depth=PIPELINE_QUEUE_DEPTH, pool=None):
+    """Decrypts every block of a block reader into a block writer, truncating the last block."""
+    compute, write = block_stages(plan, writer, True, backend, len(blocks), last_block_size)
+    return run_pipeline(blocks, compute, write, cores, len(blocks), signals, queue_depth, pool)
 
-    rsa_flag, rsa_enc_key, last_block_size = utils.read_file_header(input_path)
 
-    if rsa_flag:
+def header_key(header, raw_key=None, private_key=None):
+    """
+    Checks a parsed header against this version and returns the raw key of the file:
+    `raw_key`, or the key recovered from the header with `private_key` for RSA files.
+    """
+    if header["subkey_engine"] not in key_utils.SUBKEY_ENGINES:
+        raise ValueError(f"Unsupported subkey engine '{header['subkey_engine']}', "
+                         f"this file needs a newer Enigmatrix version")
+    if header["rsa_flag"]:
+        if private_key is None:
+            raise ValueError("This file requires an RSA private key")
         try:
-            raw_key = key_utils.rsa_decrypt_key(rsa_enc_key, private_key)
+            return key_utils.rsa_decrypt_key(header["rsa_enc_key"], private_key)
         except ValueError:
             raise ValueError("Incorrect RSA key provided")
+    return raw_key
 
-    if signals:
-        signals.time1.emit()
-        signals.update_terminal.emit(f"Using {cores} cpu cores.\n")
 
-    primary_hash = key_utils.primary_hash(raw_key)
-    seed1, seed2 = key_utils.extract_prng_seeds(primary_hash)
+# ==========================================================
+# Per-key transform plan
+# ==========================================================
+
+class TransformPlan:
+    """
+    Compiled, immutable per-key plan for the block transform.
+    Holds the resolved op sequence for both directions, the composed
+    permutation indices, the mod order and the file's subkey engine,
+    so key setup runs once per key.
+    """
+    __slots__ = ("raw_key", "primary_hash", "seed_prefix", "subkey_engine", "op_order", "mod_order",
+                 "row_swaps", "col_swaps", "permutation_order",
+                 "permutation_index", "inverse_permutation_index",
+                 "encrypt_steps", "decrypt_steps", "uses_transpose")
+
+    def __init__(self, raw_key, subkey_engine=DEFAULT_SUBKEY_ENGINE):
+        primary_hash = key_utils.primary_hash(raw_key)
+        seed1, seed2 = key_utils.extract_prng_seeds(primary_hash)
+        row_swaps, col_swaps, permutation_order, mod_order = determine_sub_operations(seed2)
+        permutation_index, inverse_permutation_index = compile_permutation(row_swaps, col_swaps)
+        permutation_index.flags.writeable = False
+        inverse_permutation_index.flags.writeable = False
 
-    file_size, *_ = utils.file_info(input_path)
+        self.raw_key = raw_key
+        self.primary_hash = primary_hash
+        self.seed_prefix = key_utils.seed_prefix(primary_hash, raw_key)
+        self.subkey_engine = subkey_engine
+        self.op_order = tuple(determine_operation_sequence(seed1))
+        self.mod_order = tuple(mod_order)
+        self.row_swaps = tuple(row_swaps)
+        self.col_swaps = tuple(col_swaps)
+        self.permutation_order = tuple(permutation_order)
+        self.permutation_index = permutation_index
+        self.inverse_permutation_index = inverse_permutation_index
+        self.encrypt_steps = self.compile_steps(decrypt=False)
+        self.decrypt_steps = self.compile_steps(decrypt=True)
+        self.uses_transpose = "modular" in self.op_order
 
-    header_size = 1 + 8
-    if rsa_flag:
-        header_size += 4 + len(rsa_enc_key)
+    def compile_steps(self, decrypt):
+        """
+        Resolves the op names into `(func, arg)` steps for `transform_block`.
+        `func` is a uint8 ufunc applied with the subkey (`arg` selects the transposed
+        subkey), or None for a permutation gather with index `arg`.
+        """
+        steps = []
+        for op in (reversed(self.op_order) if decrypt else self.op_order):
+            if op == "xor":
+                steps.append((np.bitwise_xor, False))
+            elif op == "modular":
+                for t, mod_op in enumerate(self.mod_order):
+                    # Encryption transposes on the second stage, decryption on the first
+                    func = np.add if mod_op == "add" else np.subtract
+                    steps.append((func, (t == 0) == decrypt))
+            elif op == "permutation":
+                steps.append((None, self.inverse_permutation_index if decrypt else self.permutation_index))
+        return tuple(steps)
 
-    num_blocks = utils.calculate_num_blocks(file_size, header_size)
+    def encrypt_block(self, i, buf, backend=None):
+        """Encrypts block `i`, padding it to 1MB first."""
+        return self.encrypt_batch(i, [buf], backend)[0]
 
-    op_order = determine_operation_sequence(seed1)
-    row_swaps, col_swaps, permutation_order, mod_order = determine_sub_operations(seed2)
+    def decrypt_block(self, i, buf, backend=None):
+        """Decrypts block `i`. The caller truncates the last block."""
+        return self.decrypt_batch(i, [buf], backend)[0]
 
-    processed_blocks = 0
-    progress_lock = threading.Lock()
+    def encrypt_batch(self, start, bufs, backend=None):
+        """Encrypts consecutive blocks `start, start + 1, ...` as one stacked array."""
+        with borrow_scratch(len(bufs)) as scratch:
+            return [matrix.tobytes() for matrix in self.run(start, bufs, False, backend, scratch)]
 
-    def process_block(i, block):
-        block_matrix = utils.bytes_to_matrix(block)
+    def decrypt_batch(self, start, bufs, backend=None):
+        """Decrypts consecutive blocks `start, start + 1, ...` as one stacked array."""
+        with borrow_scratch(len(bufs)) as scratch:
+            return [matrix.tobytes() for matrix in self.run(start, bufs, True, backend, scratch)]
 
-        # 🔑 Deterministic, index-based subkey derivation
-        subkey = key_utils.derive_subkey(primary_hash, raw_key, i)
-        subkey_matrix = utils.bytes_to_matrix(subkey)
+    def run(self, start, bufs, decrypt, backend, scratch):
+        """
+        Transforms consecutive blocks and returns the resulting `(N, 1024, 1024)` stack.
+        The stack lives in `scratch`, valid until the scratch is returned to the pool.
+        """
+        load_batch(bufs, scratch)
+        return self.transform(start, len(bufs), decrypt, backend, scratch)
 
-        for op in reversed(op_order):
-            if op == "permutation":
-                block_matrix = reverse_permutation(block_matrix, row_swaps, col_swaps, permutation_order)
-            elif op == "modular":
-                for t, mod_op in enumerate(mod_order):
-                    block_matrix = apply_modular_operations(block_matrix, subkey_matrix, mod_op, t == 0)
-            elif op == "xor":
+    def transform(self, start, count, decrypt, backend, scratch, indices=None):
+        """
+        Transforms `count` blocks already loaded into `scratch` by `load_batch`.
+        `indices` lists the block index of each loaded block when they are not `start, start + 1, ...`.
+        """
+        backend = backend or backends.get_backend()
+        work = scratch["block"][:count]
+        subkeys = scratch["subkey"][:count]
+        for n, i in enumerate(indices or range(start, start + count)):
+            subkeys[n] = self.subkey(i, backend)
+        return backend.transform(self, work, subkeys, decrypt, scratch)
+
+    def subkey(self, i, backend):
+        """Returns block `i`'s subkey matrix from the shared subkey cache, deriving it on a miss."""
+        matrix = subkey_cache.shared_cache.get(self.primary_hash, self.subkey_engine, i)
+        if matrix is None:
+            # 🔑 Deterministic, index-based subkey derivation
+            subkey = key_utils.derive_subkey(self.primary_hash, self.raw_key, i, backend.expand_subkey,
+                                             self.subkey_engine, self.seed_prefix)
+            matrix = utils.bytes_to_matrix(subkey)
+            subkey_cache.shared_cache.put(self.primary_hash, self.subkey_engine, i, matrix)
+        return matrix
+
+
+# Compiled plans keyed by the key fingerprint (its primary hash) and subkey engine,
+# least recently used first
+_plan_cache = OrderedDict()
+_plan_cache_lock = threading.Lock()
+
+
+def get_plan(raw_key, subkey_engine=DEFAULT_SUBKEY_ENGINE):
+    """Returns the cached `TransformPlan` for `raw_key`, compiling it on first use."""
+    fingerprint = (key_utils.primary_hash(raw_key), subkey_engine)
+    with _plan_cache_lock:
+        plan = _plan_cache.get(fingerprint)
+        if plan is not None:
+            _plan_cache.move_to_end(fingerprint)
+            return plan
+    plan = TransformPlan(raw_key, subkey_engine)
+    with _plan_cache_lock:
+        _plan_cache[fingerprint] = plan
+        while len(_plan_cache) > PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+    return plan
+
+
+# ==========================================================
+# Fused in-place block transform
+# ==========================================================
+
+# Free scratch sets, reused by every batch of a job and kept down to one set between jobs
+_scratch_pool = []
+_scratch_pool_lock = threading.Lock()
+
+
+def aligned_empty(shape, alignment=BUFFER_ALIGNMENT):
+    """Uninitialized uint8 array whose data starts on an `alignment` byte boundary."""
+    size = int(np.prod(shape))
+    raw = np.empty(size + alignment, dtype=np.uint8)
+    offset = -raw.ctypes.data % alignment
+    return raw[offset:offset + size].reshape(shape)
+
+
+def new_scratch(count):
+    """Allocates a scratch set: block, spare and subkey stacks for `count` blocks."""
+    shape = (count, MATRIX_SIZE, MATRIX_SIZE)
+    return {name: aligned_empty(shape) for name in ("block", "spare", "subkey")}
+
+
+def scratch_size(buffers):
+    return sum(stack.nbytes for stack in buffers.values())
+
+
+def acquire_scratch(count=1):
+    """
+    Takes a scratch set for at least `count` blocks from the pool, allocating one only
+    when no free set is large enough. Pair with `release_scratch`, so peak memory stays
+    at the sets in flight and nothing is left for the garbage collector.
+    """
+    with _scratch_pool_lock:
+        for n, free in enumerate(_scratch_pool):
+            if len(free["block"]) >= count:
+                return _scratch_pool.pop(n)
+    return new_scratch(count)
+
+
+def release_scratch(buffers):
+    with _scratch_pool_lock:
+        _scratch_pool.append(buffers)
+        # Idle sets beyond the batch memory budget are dropped, smallest first
+        _scratch_pool.sort(key=scratch_size, reverse=True)
+        while sum(map(scratch_size, _scratch_pool)) > BATCH_MEMORY_BUDGET:
+            _scratch_pool.pop()
+
+
+def trim_scratch_pool():
+    """
+    Frees the idle scratch sets beyond the largest once a job is done, so a long-lived process
+    keeps one batch of scratch between jobs rather than the whole batch memory budget.
+    """
+    with _scratch_pool_lock:
+        # The pool is kept sorted largest first
+        del _scratch_pool[1:]
+
+
+@contextmanager
+def borrow_scratch(count=1):
+    """Lends a scratch set from the pool for the duration of a `with` block."""
+    buffers = acquire_scratch(count)
+    try:
+        yield buffers
+    finally:
+        release_scratch(buffers)
+
+
+def load_batch(bufs, scratch):
+    """Loads consecutive blocks into the block stack of `scratch`."""
+    for n, buf in enumerate(bufs):
+        load_block(scratch["block"][n], buf)
+
+
+def load_block(work, block):
+    """Copies `block` into a scratch matrix and zero-fills the padding in place."""
+    flat = work.reshape(-1)
+    length = len(block)
+    flat[:length] = np.frombuffer(block, dtype=np.uint8)
+    flat[length:] = 0
+
+
+def transform_block(work, subkeys, steps, uses_transpose, scratch, gather=None):
+    """
+    Runs compiled plan steps on a `(N, 1024, 1024)` stack with no intermediate allocations.
+    Each ufunc call covers the whole stack. Modular stages rely on native uint8
+    wraparound, which equals `% 256`. `gather(work, index, out)` overrides the
+    permutation gather. Returns the scratch stack holding the result.
+    """
+    count = len(work)
+    spare = scratch["spare"][:count]
+    # A plan applies the transposed subkey in exactly one modular stage, which reads this
+    # strided view as fast as a contiguous copy would be made, without a fourth stack
+    subkeys_t = subkeys.swapaxes(1, 2) if uses_transpose else None
+
+    for func, arg in steps:
+        if func is None:
+            if gather:
+                gather(work, arg, spare)
+            elif count == 1:
+                np.take(work.reshape(-1), arg, out=spare[0])
+            else:
+                np.take(work.reshape(count, -1), arg, axis=1, out=spare)
+            work, spare = spare, work
+        else:
+            func(work, subkeys_t if arg else subkeys, out=work)
+
+    return work
+
+
+def numpy_transform(plan, work, subkeys, decrypt, scratch):
+    """Optimized NumPy backend: fused in-place kernel over the compiled plan steps."""
+    steps = plan.decrypt_steps if decrypt else plan.encrypt_steps
+    return transform_block(work, subkeys, steps, plan.uses_transpose, scratch)
+
+
+def reference_transform(plan, work, subkeys, decrypt, scratch):
+    """Reference NumPy backend: the original per-op helpers and swap sequences, block by block."""
+    for n in range(len(work)):
+        block_matrix = work[n]
+        subkey_matrix = subkeys[n]
+        for op in (reversed(plan.op_order) if decrypt else plan.op_order):
+            if op == "xor":
                 block_matrix = apply_xor(block_matrix, subkey_matrix)
+            elif op == "modular":
+                for t, mod_op in enumerate(plan.mod_order):
+                    block_matrix = apply_modular_operations(block_matrix, subkey_matrix, mod_op, t == (0 if decrypt else 1))
+            elif op == "permutation":
+                permute = reverse_permutation if decrypt else apply_permutation
+                block_matrix = permute(block_matrix, plan.row_swaps, plan.col_swaps, plan.permutation_order)
+        work[n] = block_matrix
+    return work
 
-        block = utils.matrix_to_bytes(block_matrix)
 
-        if i == num_blocks - 1:
-            block = utils.truncate_block(block, last_block_size)
+def jit_transform(plan, work, subkeys, decrypt, scratch):
+    """JIT backend: the fused kernel with a numba-compiled permutation gather."""
+    steps = plan.decrypt_steps if decrypt else plan.encrypt_steps
+    jit_kernels = importlib.import_module("jit_kernels")
+    return transform_block(work, subkeys, steps, plan.uses_transpose, scratch, gather=jit_kernels.gather)
 
-        del block_matrix, subkey_matrix
-        return block
 
-    with ThreadPoolExecutor(max_workers=cores) as executor:
-        block_iterator = enumerate(utils.read_file_in_blocks(input_path, pointer=header_size))
-        futures = set()
-        future_to_block = {}
+def jit_expand_subkey(initial_seed, algorithm_name):
+    return importlib.import_module("jit_kernels").expand_subkey(initial_seed, algorithm_name)
 
-        for _ in range(cores):
+
+backends.register_backend(backends.Backend(
+    "reference", reference_transform, key_utils.expand_subkey_loop,
+    "Original per-op NumPy helpers and byte-wise subkey expansion."))
+backends.register_backend(backends.Backend(
+    "numpy", numpy_transform, key_utils.expand_subkey,
+    "Fused in-place NumPy kernel with vectorized subkey expansion."))
+if HAS_NUMBA:
+    backends.register_backend(backends.Backend(
+        "numba", jit_transform, jit_expand_subkey,
+        "Fused kernel with numba-compiled permutation gather and feedback XOR."))
+
+
+def choose_batch_size(cores, budget=BATCH_MEMORY_BUDGET):
+    """Number of blocks per batch so that all in-flight batches fit in `budget` bytes."""
+    # Three scratch stacks plus the subkey derivation buffers of every block
+    per_block = 5 * BLOCK_SIZE
+    return max(1, min(MAX_BATCH_BLOCKS, budget // (cores * per_block)))
+
+
+def report_progress(signals, processed_blocks, num_blocks):
+    """Emits the progress signals after `processed_blocks` blocks are written, unless the total is unknown."""
+    if not signals or num_blocks is None:
+        return
+    progress_percent = int((processed_blocks / num_blocks) * 100)
+    if processed_blocks == num_blocks:
+        signals.time2.emit()
+    signals.progress_update.emit(progress_percent)
+    signals.nblock_update.emit(processed_blocks, num_blocks)
+    signals.terminal_progress.emit(processed_blocks, num_blocks)
+
+
+def write_result(writer, i, matrix, num_blocks, last_block_size):
+    """Writes a transformed block at its offset, truncating the last decrypted block."""
+    if i == num_blocks - 1:
+        matrix = matrix.reshape(-1)[:last_block_size]
+    writer.write_block(i, matrix)
+
+
+class PipelineStats:
+    """
+    Queue occupancy and wait times of a pipelined run, shared by all stage threads.
+    A full compute queue means the compute stage is the bottleneck; a near-empty one
+    means reads are; a full write queue means writes are.
+    """
+    STAGES = ("reader", "compute", "writer")
+    QUEUES = ("compute_queue", "write_queue")
+
+    def __init__(self, queue_depth, batch_size):
+        self.queue_depth = queue_depth
+        self.batch_size = batch_size
+        self.samples = {name: [0, 0, 0] for name in self.QUEUES}  # count, total, max
+        self.starved = dict.fromkeys(self.STAGES, 0.0)  # seconds waiting on an empty input queue
+        self.blocked = dict.fromkeys(self.STAGES, 0.0)  # seconds waiting on a full output queue
+        self.busy = dict.fromkeys(self.STAGES, 0.0)  # seconds reading, computing and writing
+        self.lock = threading.Lock()
+
+    def sample(self, name, size):
+        with self.lock:
+            samples = self.samples[name]
+            samples[0] += 1
+            samples[1] += size
+            samples[2] = max(samples[2], size)
+
+    def add_wait(self, waits, stage, seconds):
+        with self.lock:
+            waits[stage] += seconds
+
+    def summary(self):
+        occupancy = {}
+        for name, (count, total, peak) in self.samples.items():
+            occupancy[name] = {
+                "mean": round(total / count, 2) if count else 0.0,
+                "max": peak,
+                "depth": self.queue_depth,
+            }
+        fill = {name: stats["mean"] / self.queue_depth for name, stats in occupancy.items()}
+        if fill["write_queue"] > 0.75:
+            bottleneck = "write"
+        elif fill["compute_queue"] < 0.25:
+            bottleneck = "read"
+        else:
+            bottleneck = "compute"
+        return {
+            "queues": occupancy,
+            "starved_s": {stage: round(t, 3) for stage, t in self.starved.items()},
+            "blocked_s": {stage: round(t, 3) for stage, t in self.blocked.items()},
+            "busy_s": {stage: round(t, 3) for stage, t in self.busy.items()},
+            "batch_size": self.batch_size,
+            "bottleneck": bottleneck,
+        }
+
+
+# Statistics of the latest pipelined run in this process, shown by `info --pipeline`
+last_pipeline_stats = None
+
+
+def stage_put(q, item, failed, stats, stage):
+    """Puts `item` on a bounded stage queue, giving up if another stage failed."""
+    wait_start = time.perf_counter()
+    while not failed.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            break
+        except queue.Full:
+            pass
+    stats.add_wait(stats.blocked, stage, time.perf_counter() - wait_start)
+    return not failed.is_set()
+
+
+def stage_acquire(slots, failed, stats, stage):
+    """Takes an in-flight batch slot, giving up if another stage failed."""
+    wait_start = time.perf_counter()
+    while not failed.is_set():
+        if slots.acquire(timeout=0.1):
+            break
+    stats.add_wait(stats.blocked, stage, time.perf_counter() - wait_start)
+    return not failed.is_set()
+
+
+def stage_get(q, failed, stats, stage, name):
+    """Takes the next item from a stage queue, or None at the end or if another stage failed."""
+    stats.sample(name, q.qsize())
+    wait_start = time.perf_counter()
+    item = None
+    while not failed.is_set():
+        try:
+            item = q.get(timeout=0.1)
+            break
+        except queue.Empty:
+            pass
+    stats.add_wait(stats.starved, stage, time.perf_counter() - wait_start)
+    return item
+
+
+def run_pipeline(blocks, compute, write, cores, num_blocks, signals, queue_depth=PIPELINE_QUEUE_DEPTH, pool=None,
+                 ordered=False, batch_size=None):
+    """
+    Runs a job as three stages joined by bounded queues of `queue_depth` batches:
+    - a reader thread loads batches of consecutive blocks from the block reader into pooled scratch,
+    - `cores` compute threads run `compute(start, count, scratch)`, which returns the result stack,
+    - a writer thread runs `write(start, work)` and returns the scratch to the pool.
+    The queue depth is independent of the compute thread count. Compute stages run on
+    `pool`, a persistent `ThreadPoolExecutor`, when given.
+    `num_blocks` None reads until the reader runs out, for a `utils.StreamReader`.
+    `ordered` writes batches in block order, for unseekable outputs. Returns `PipelineStats.summary()`.
+    """
+    global last_pipeline_stats
+    cores = cores or utils.get_default_core_count()
+    queue_depth = max(1, queue_depth)
+    # Batches in flight: both queues full plus one per compute thread and one per I/O thread
+    in_flight = cores + 2 * queue_depth + 2
+    batch_size = batch_size or choose_batch_size(in_flight)
+    # Ordered writes hold finished batches back, so the reader waits for a free slot
+    slots = threading.Semaphore(in_flight)
+    compute_queue = queue.Queue(queue_depth)
+    write_queue = queue.Queue(queue_depth)
+    stats = PipelineStats(queue_depth, batch_size)
+    failed = threading.Event()
+    errors = []
+
+    def stage(func):
+        def run():
             try:
-                i, block = next(block_iterator)
-                future = executor.submit(process_block, i, block)
-                futures.add(future)
-                future_to_block[future] = i
-            except StopIteration:
+                func()
+            except BaseException as e:
+                errors.append(e)
+                failed.set()
+        return run
+
+    def timed(name, func, *args):
+        busy_start = time.perf_counter()
+        result = func(*args)
+        stats.add_wait(stats.busy, name, time.perf_counter() - busy_start)
+        return result
+
+    def reader():
+        start = 0
+        while num_blocks is None or start < num_blocks:
+            count = batch_size if num_blocks is None else min(batch_size, num_blocks - start)
+            if not stage_acquire(slots, failed, stats, "reader"):
+                return
+            scratch = acquire_scratch(count)
+            read = timed("reader", blocks.read_batch, start, count, scratch["block"])
+            if not read:
+                release_scratch(scratch)
+                slots.release()
+                break
+            if not stage_put(compute_queue, (start, read, scratch), failed, stats, "reader"):
+                return
+            if read < count:
                 break
+            start += read
+        for _ in range(cores):
+            stage_put(compute_queue, None, failed, stats, "reader")
 
-        next_index = 0
-        results = {}
+    def computer():
+        while item := stage_get(compute_queue, failed, stats, "compute", "compute_queue"):
+            start, count, scratch = item
+            work = timed("compute", compute, start, count, scratch)
+            if not stage_put(write_queue, (start, work, scratch), failed, stats, "compute"):
+                return
+
+    processed_blocks = 0
+
+    def writer():
+        nonlocal processed_blocks
+        held = {}
+        next_start = 0
+        while item := stage_get(write_queue, failed, stats, "writer", "write_queue"):
+            ready = [item]
+            if ordered:
+                # Batches that finish early wait for the ones before them
+                held[item[0]] = item
+                ready = []
+                while next_start in held:
+                    ready.append(held.pop(next_start))
+                    next_start += len(ready[-1][1])
+            for start, work, scratch in ready:
+                timed("writer", write, start, work)
+                release_scratch(scratch)
+                slots.release()
+                processed_blocks += len(work)
+                report_progress(signals, processed_blocks, num_blocks)
+
+    read_thread = threading.Thread(target=stage(reader), daemon=True)
+    write_thread = threading.Thread(target=stage(writer), daemon=True)
+    read_thread.start()
+    write_thread.start()
+    if pool:
+        compute_joins = [pool.submit(stage(computer)).result for _ in range(cores)]
+    else:
+        compute_threads = [threading.Thread(target=stage(computer), daemon=True) for _ in range(cores)]
+        for thread in compute_threads:
+            thread.start()
+        compute_joins = [thread.join for thread in compute_threads]
+    read_thread.join()
+    for join in compute_joins:
+        join()
+    stage_put(write_queue, None, failed, stats, "compute")
+    write_thread.join()
+    trim_scratch_pool()
+
+    if errors:
+        raise errors[0]
+    last_pipeline_stats = stats.summary()
+    return last_pipeline_stats
+
+
+# ==========================================================
+# Process-pool execution
+# ==========================================================
+
+# Per-process state, loaded once by `init_process_worker` for the whole job
+_worker_state = {}
+
+
+def init_process_worker(job):
+    """Maps the input file, opens the output file and loads the per-key plan once."""
+    # A worker lives for a single job and sees each block index once, so caching cannot hit
+    subkey_cache.shared_cache.set_budget(0)
+    _worker_state.update(
+        plan=get_plan(job["raw_key"], job["subkey_engine"]),
+        backend=backends.get_backend(job["engine"]),
+        decrypt=job["decrypt"],
+        num_blocks=job["num_blocks"],
+        last_block_size=job["last_block_size"],
+        reader=utils.BlockReader(job["input_path"], job["pointer"], job["direct_io"], job["trailer"]),
+        writer=utils.BlockWriter(job["output_path"], job["header_size"], job["direct_io"]),
+    )
+    # Runs as the worker exits, before the pool shutdown returns, so direct I/O gets the
+    # same fdatasync and cache drop as in thread mode
+    multiprocessing.util.Finalize(None, close_process_worker, exitpriority=10)
+
+
+def close_process_worker():
+    """Closes the worker's writer, then unmaps its input."""
+    try:
+        _worker_state["writer"].close()
+    finally:
+        _worker_state["reader"].close()
+
+
+def process_block(i):
+    """Reads block `i` with the worker's own reader, transforms it and writes it at its offset."""
+    with borrow_scratch() as scratch:
+        _worker_state["reader"].read_into(i, scratch["block"][0])
+        work = _worker_state["plan"].transform(i, 1, _worker_state["decrypt"], _worker_state["backend"], scratch)
+        if _worker_state["decrypt"]:
+            write_result(_worker_state["writer"], i, work[0], _worker_state["num_blocks"], _worker_state["last_block_size"])
+        else:
+            _worker_state["writer"].write_block(i, work[0])
+
+
+def run_in_processes(job, cores, num_blocks, signals):
+    """
+    Processes blocks on a process pool. Only block indices are sent to the workers:
+    each worker maps `job["input_path"]` itself and writes its results at their own
+    offsets in `job["output_path"]`.
+    `job` carries the key, direction, engines, block counts and file paths for the worker initializer.
+    """
+    cores = cores or utils.get_default_core_count()
+    # Twice the worker count, so a worker's next block is queued while it runs
+    max_in_flight = cores * 2
+    processed_blocks = 0
+
+    with ProcessPoolExecutor(
+        max_workers=cores,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_process_worker,
+        initargs=(job,),
+    ) as executor:
+        block_indices = iter(range(num_blocks))
+        futures = set()
+
+        def submit_blocks():
+            for i in itertools.islice(block_indices, max_in_flight - len(futures)):
+                futures.add(executor.submit(process_block, i))
+
+        submit_blocks()
 
         while futures:
             done, futures = concurrent.futures.wait(
@@ -190,34 +1068,11 @@ def decrypt_file(input_path, output_path, raw_key=None, private_key=None, cores=
             )
 
             for future in done:
-                i = future_to_block[future]
-                results[i] = future.result()
-                del future_to_block[future]
-
-                while next_index in results:
-                    utils.write_to_file(output_path, results[next_index])
-                    del results[next_index]
-                    next_index += 1
-
-                    if signals:
-                        with progress_lock:
-                            processed_blocks += 1
-                            progress_percent = int((processed_blocks / num_blocks) * 100)
-                            if processed_blocks == num_blocks:
-                                signals.time2.emit()
-                            signals.progress_update.emit(progress_percent)
-                            signals.nblock_update.emit(processed_blocks, num_blocks)
-                            signals.terminal_progress.emit(processed_blocks, num_blocks)
-
-                try:
-                    i, block = next(block_iterator)
-                    new_future = executor.submit(process_block, i, block)
-                    futures.add(new_future)
-                    future_to_block[new_future] = i
-                except StopIteration:
-                    pass
-
-    gc.collect()
+                future.result()
+                processed_blocks += 1
+                report_progress(signals, processed_blocks, num_blocks)
+
+            submit_blocks()
 
 
 # === unchanged helpers below ===
@@ -256,6 +1111,27 @@ def reverse_permutation(matrix, row_swaps, col_swaps, order):
     return temp_matrix
 
 
+def compile_swaps(swaps):
+    """Folds a swap sequence into one index array, `index[k]` is the source of position `k`."""
+    index = list(range(MATRIX_SIZE))
+    for i, j in swaps:
+        index[i], index[j] = index[j], index[i]
+    return np.array(index, dtype=np.intp)
+
+
+def compile_permutation(row_swaps, col_swaps):
+    """
+    Folds the row and column swaps into flat gather indices, once per key.
+    Row and column swaps commute, so the permutation order does not change the result.
+    Returns the forward index and its inverse for decryption.
+    """
+    rows = compile_swaps(row_swaps)
+    cols = compile_swaps(col_swaps)
+    forward = rows[:, None] * MATRIX_SIZE + cols[None, :]
+    inverse = np.argsort(rows)[:, None] * MATRIX_SIZE + np.argsort(cols)[None, :]
+    return forward, inverse
+
+
 def apply_modular_operations(matrix, subkey, mod_op, transpose=False):
     temp_matrix = matrix.copy()
     temp_subkey = subkey.copy()
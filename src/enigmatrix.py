@@ -0,0 +1,13 @@
+"""
+Enigmatrix as a library, `from enigmatrix import Enigmatrix`, and the
+`python -m enigmatrix` entry point for the headless command line interface.
+"""
+import sys
+from session import Enigmatrix, JobStats
+from encryptor import encrypt_bytes, decrypt_bytes
+from file_io import EnigmatrixWriter, EnigmatrixReader, decrypt_range
+from dir_sync import sync_directory
+from cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""
+File-like objects over the Enigmatrix formats.
+"""
+import io
+import os
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import utils
+import backends
+import encryptor
+from cfg import *
+
+
+class ChunkStream:
+    """Read end of the chunk queue between an `EnigmatrixWriter` and its encryption thread."""
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.current = memoryview(b"")
+        self.eof = False
+
+    def readinto(self, buffer):
+        while not self.current:
+            if self.eof:
+                return 0
+            chunk = self.chunks.get()
+            if chunk is None:
+                self.eof = True
+                return 0
+            self.current = memoryview(chunk)
+        length = min(len(buffer), len(self.current))
+        buffer[:length] = self.current[:length]
+        self.current = self.current[length:]
+        return length
+
+    def read(self, size):
+        buffer = bytearray(size)
+        return bytes(buffer[:self.readinto(buffer)])
+
+
+class EnigmatrixWriter(io.RawIOBase):
+    """
+    Writable file-like object that encrypts everything written to it into `target`,
+    a path or a binary file object, in the streaming format.
+    Writes are gathered into 1MB blocks, and full blocks are encrypted on the block
+    pipeline as they fill, by a background thread running `encryptor.encrypt_stream`.
+    Memory use is bounded by the blocks in flight, however much is written.
+    `close` encrypts the last partial block and writes the trailer.
+    """
+    def __init__(self, target, raw_key, public_key=None, cores=None, engine=None,
+                 subkey_engine=DEFAULT_SUBKEY_ENGINE, queue_depth=PIPELINE_QUEUE_DEPTH):
+        super().__init__()
+        self.owns_target = isinstance(target, (str, bytes, os.PathLike))
+        self.target = open(target, "wb") if self.owns_target else target
+        self.pending = bytearray()
+        self.chunks = queue.Queue(queue_depth + 1)
+        self.error = None
+        self.pipeline = None
+        self.thread = threading.Thread(
+            target=self.encrypt, args=(raw_key, public_key, cores, engine, subkey_engine, queue_depth), daemon=True)
+        self.thread.start()
+
+    def encrypt(self, *args):
+        try:
+            self.pipeline = encryptor.encrypt_stream(ChunkStream(self.chunks), self.target, *args)
+        except BaseException as e:
+            self.error = e
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("write to closed file")
+        self.check()
+        self.pending += data
+        if len(self.pending) >= BLOCK_SIZE:
+            full = len(self.pending) - len(self.pending) % BLOCK_SIZE
+            self.send(bytes(self.pending[:full]))
+            del self.pending[:full]
+        return memoryview(data).nbytes
+
+    def send(self, chunk):
+        """Queues a chunk for the encryption thread, waiting while it is busy."""
+        while True:
+            self.check()
+            try:
+                self.chunks.put(chunk, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def check(self):
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self.thread.is_alive():
+                if self.pending:
+                    self.send(bytes(self.pending))
+                self.send(None)
+                self.thread.join()
+            self.check()
+        finally:
+            if self.owns_target:
+                self.target.close()
+            super().close()
+
+
+class EnigmatrixReader(io.RawIOBase):
+    """
+    Seekable, read-only file-like view of the plaintext of an encrypted file.
+    Blocks are index-keyed, so a read decrypts only the blocks covering the requested
+    range, `cores` blocks at a time. The last `cache_blocks` decrypted blocks are kept,
+    and `prefetch` blocks past a sequential read are decrypted in the background.
+    """
+    def __init__(self, file_path, raw_key=None, private_key=None, cores=None, engine=None,
+                 cache_blocks=READER_CACHE_BLOCKS, prefetch=READER_PREFETCH_BLOCKS):
+        super().__init__()
+        header = utils.read_header(file_path)
+        self.plan = encryptor.get_plan(encryptor.header_key(header, raw_key, private_key), header["subkey_engine"])
+        self.backend = backends.get_backend(engine)
+        self.blocks = utils.BlockReader(file_path, header["header_size"], trailer=header["trailer_size"])
+        self.num_blocks = len(self.blocks)
+        self.last_block_size = utils.header_last_block_size(header)
+        self.size = utils.plaintext_size(header, self.num_blocks)
+        self.cores = cores or utils.get_default_core_count()
+        self.cache_blocks = max(1, cache_blocks)
+        self.prefetch = prefetch
+        self.cache = OrderedDict()
+        self.pending = OrderedDict()
+        self.position = 0
+        self.last_end = 0
+        self.pool = ThreadPoolExecutor(max_workers=self.cores, thread_name_prefix="enigmatrix-reader")
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self.position = offset
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast("B")
+        length = min(len(view), self.size - self.position)
+        if length <= 0:
+            return 0
+        sequential = self.position == self.last_end
+        first = self.position // BLOCK_SIZE
+        last = (self.position + length - 1) // BLOCK_SIZE
+        copied = 0
+        for i in range(first, last + 1):
+            self.schedule(range(i, min(i + self.cores, last + 1)))
+            block = self.block(i)
+            start = self.position - i * BLOCK_SIZE
+            count = min(len(block) - start, length - copied)
+            view[copied:copied + count] = block[start:start + count]
+            copied += count
+            self.position += count
+        self.last_end = self.position
+        if sequential:
+            self.schedule(range(last + 1, min(last + 1 + self.prefetch, self.num_blocks)))
+        return copied
+
+    def schedule(self, indices):
+        """Starts decrypting blocks that are neither cached nor already being decrypted."""
+        for i in indices:
+            if i not in self.cache and i not in self.pending:
+                self.pending[i] = self.pool.submit(self.decrypt, i)
+        # Read-ahead that was never read is dropped, oldest first
+        while len(self.pending) > self.cache_blocks + self.cores:
+            _, future = self.pending.popitem(last=False)
+            future.cancel()
+
+    def block(self, i):
+        """Returns decrypted block `i` from the cache, waiting for or running its decryption on a miss."""
+        data = self.cache.get(i)
+        if data is not None:
+            self.cache.move_to_end(i)
+            return data
+        future = self.pending.pop(i, None)
+        data = future.result() if future else self.decrypt(i)
+        self.cache[i] = data
+        while len(self.cache) > self.cache_blocks:
+            self.cache.popitem(last=False)
+        return data
+
+    def decrypt(self, i):
+        data = self.plan.decrypt_block(i, self.blocks.block(i), self.backend)
+        return data[:self.last_block_size] if i == self.num_blocks - 1 else data
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.pool.shutdown(cancel_futures=True)
+            self.cache.clear()
+            self.pending.clear()
+            self.blocks.close()
+        finally:
+            super().close()
+
+
+def decrypt_range(input_path, output, offset=0, length=None, raw_key=None, private_key=None, cores=None,
+                  engine=None, signals=None):
+    """
+    Decrypts `length` bytes of plaintext from `offset` (to the end when None) into `output`,
+    a path or a binary file object, decrypting only the blocks that cover the range.
+    Returns the number of bytes written.
+    """
+    with EnigmatrixReader(input_path, raw_key, private_key, cores, engine, prefetch=0) as reader:
+        end = reader.size if length is None else min(offset + length, reader.size)
+        reader.seek(offset)
+        if signals:
+            signals.time1.emit()
+            signals.update_terminal.emit(f"Using {reader.cores} cpu cores.\n")
+        # One block per core in each read
+        chunk = bytearray(reader.cores * BLOCK_SIZE)
+        total = max(end - offset, 0)
+        written = 0
+        owns_output = isinstance(output, (str, bytes, os.PathLike))
+        f = open(output, "wb") if owns_output else output
+        try:
+            while written < total:
+                count = reader.readinto(memoryview(chunk)[:min(len(chunk), total - written)])
+                f.write(memoryview(chunk)[:count])
+                written += count
+                encryptor.report_progress(signals, -(-written // BLOCK_SIZE), -(-total // BLOCK_SIZE))
+        finally:
+            if owns_output:
+                f.close()
+    return written
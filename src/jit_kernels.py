@@ -0,0 +1,43 @@
+"""
+JIT-compiled kernels for the optional "numba" backend.
+Importing this module raises ImportError when numba is not installed.
+"""
+import numba
+import numpy as np
+import key_utils
+from cfg import *
+
+
+# Kernels are serial: parallelism comes from the block executor, and numba's
+# default threading layer must not be entered from several threads at once.
+
+@numba.njit(cache=True, nogil=True)
+def gather_stack(work, index, out):
+    """Permutation gather over a `(N, 1024, 1024)` stack, `out[n].flat[k] = work[n].flat[index.flat[k]]`."""
+    flat_work = work.reshape(work.shape[0], -1)
+    flat_index = index.reshape(-1)
+    flat_out = out.reshape(out.shape[0], -1)
+    for n in range(flat_work.shape[0]):
+        for k in range(flat_index.shape[0]):
+            flat_out[n, k] = flat_work[n, flat_index[k]]
+
+
+@numba.njit(cache=True, nogil=True)
+def xor_feedback(chain, out):
+    """Feedback XOR of consecutive hashes, `out[k] = chain[k] ^ chain[k + 1]`."""
+    for k in range(out.shape[0]):
+        for j in range(out.shape[1]):
+            out[k, j] = chain[k, j] ^ chain[k + 1, j]
+
+
+def gather(work, index, out):
+    gather_stack(work, index, out)
+    return out
+
+
+def expand_subkey(initial_seed, algorithm_name):
+    """Subkey expansion with the JIT-compiled feedback XOR. Output matches `key_utils.expand_subkey`."""
+    chain = key_utils.hash_chain(initial_seed, algorithm_name)
+    expanded_key = np.empty((chain.shape[0] - 1, chain.shape[1]), dtype=np.uint8)
+    xor_feedback(chain, expanded_key)
+    return expanded_key.reshape(-1)[:BLOCK_SIZE].tobytes()
@@ -1,8 +1,9 @@
 import hashlib
 import os
+import numpy as np
 from cfg import *
 from Crypto.PublicKey import RSA
-from Crypto.Cipher import PKCS1_OAEP
+from Crypto.Cipher import PKCS1_OAEP, AES
 
 algorithms = {
     "blake2b": hashlib.blake2b,
@@ -56,6 +57,17 @@ def load_rsa_key(file_path):
     return key
 
 
+def load_keyfile(file_path):
+    """Reads a keyfile. Its raw bytes are used as the key, exactly like a typed key."""
+    with open(file_path, "rb") as f:
+        return f.read()
+
+
+def rsa_max_key_len(public_key):
+    """Longest raw key that fits in one RSA-OAEP (SHA-1) block of `public_key`, whatever its size."""
+    return public_key.size_in_bytes() - 2 * 20 - 2
+
+
 def primary_hash(raw_key):
     return hashlib.sha512(raw_key).digest()
 
@@ -64,19 +76,77 @@ def primary_hash(raw_key):
 # Deterministic, index-based subkey derivation (NEW)
 # ==========================================================
 
-def derive_subkey(primary_hash, raw_key, block_index):
+def seed_prefix(primary_hash, raw_key):
+    """
+    SHA-512 state with the `primary_hash + raw_key` seed prefix already absorbed.
+    Copying it per block keeps seed derivation constant in the key length.
+    """
+    return hashlib.sha512(primary_hash + raw_key)
+
+
+def block_seed(prefix, block_index):
+    """Domain-separated seed for a block, `sha512(primary_hash + raw_key + index_bytes)`."""
+    state = prefix.copy()
+    state.update(block_index.to_bytes(8, "big"))
+    return state.digest()
+
+
+def derive_subkey(primary_hash, raw_key, block_index, expand=None, subkey_engine=DEFAULT_SUBKEY_ENGINE, prefix=None):
     """
     Deterministically derives a 1MB subkey for a given block index.
     This replaces the non-deterministic streaming generator for
     parallel-safe encryption/decryption.
+    `expand` overrides the chained expansion, e.g. with a backend's implementation.
+    `subkey_engine` is the engine ID recorded in the file header.
+    `prefix` is the key's `seed_prefix` state, computed here when not given.
     """
-    index_bytes = block_index.to_bytes(8, "big")
+    prefix = prefix or seed_prefix(primary_hash, raw_key)
 
     # Domain-separated seed for this block
-    seed = hashlib.sha512(primary_hash + raw_key + index_bytes).digest()
+    seed = block_seed(prefix, block_index)
+
+    name, generator = SUBKEY_ENGINES[subkey_engine]
+    return generator(seed, raw_key, expand)
+
+
+# ==========================================================
+# Versioned subkey engines, the ID is recorded in the file header
+# ==========================================================
+
+def sha512_chain_subkey(seed, raw_key, expand=None):
+    """Engine 0: chained SHA-512 expansion with XOR feedback. Used by every file before engine IDs."""
+    expand = expand or expand_subkey
+    return expand(seed + raw_key, "sha512")
+
+
+def shake256_subkey(seed, raw_key, expand=None):
+    """Engine 1: the whole 1MB subkey from a single SHAKE256 call."""
+    return hashlib.shake_256(seed + raw_key).digest(BLOCK_SIZE)
+
 
-    # Reuse existing expansion logic
-    return expand_subkey(seed + raw_key, "sha512")
+def aes_ctr_subkey(seed, raw_key, expand=None):
+    """Engine 2: AES-256-CTR keystream keyed by the block seed, 1MB in a single call."""
+    cipher = AES.new(seed[:32], AES.MODE_CTR, nonce=seed[32:40])
+    return cipher.encrypt(bytes(BLOCK_SIZE))
+
+
+SUBKEY_ENGINES = {
+    0: ("sha512-chain", sha512_chain_subkey),
+    1: ("shake256", shake256_subkey),
+    2: ("aes-ctr", aes_ctr_subkey),
+}
+
+
+def subkey_engine_names():
+    return [name for name, _ in SUBKEY_ENGINES.values()]
+
+
+def subkey_engine_id(name):
+    """Resolves a subkey engine name to the ID stored in the file header."""
+    for engine_id, (engine_name, _) in SUBKEY_ENGINES.items():
+        if engine_name == name:
+            return engine_id
+    raise ValueError(f"Unknown subkey engine '{name}'. Available options: {', '.join(subkey_engine_names())}")
 
 
 def key_expansion_stream(primary_hash, raw_key, num_blocks):
@@ -100,9 +170,41 @@ def key_expansion_stream(primary_hash, raw_key, num_blocks):
         yield sub_key
 
 
+def hash_chain(initial_seed, algorithm_name):
+    """
+    Collects the hash chain used by subkey expansion into a preallocated NumPy buffer.
+    Row k holds the k-th hash, one more row than needed to fill 1MB.
+    """
+    hashing_algorithm = algorithms[algorithm_name]
+    digest_size = hashing_algorithm().digest_size
+    rounds = -(-BLOCK_SIZE // digest_size)
+
+    chain = np.empty((rounds + 1, digest_size), dtype=np.uint8)
+    chain_view = memoryview(chain).cast("B")
+
+    prev_hash = hashing_algorithm(initial_seed).digest()
+    chain_view[:digest_size] = prev_hash
+    for offset in range(digest_size, (rounds + 1) * digest_size, digest_size):
+        prev_hash = hashing_algorithm(prev_hash).digest()
+        chain_view[offset:offset + digest_size] = prev_hash
+    return chain
+
+
 def expand_subkey(initial_seed, algorithm_name):
     """
     Expands an initial hash seed into a full 1MB subkey using XOR feedback.
+    The feedback XOR of consecutive hashes in the chain is applied in a single
+    vectorized pass. Output is bit-identical to `expand_subkey_loop`.
+    """
+    chain = hash_chain(initial_seed, algorithm_name)
+    expanded_key = np.bitwise_xor(chain[:-1], chain[1:])
+    return expanded_key.reshape(-1)[:BLOCK_SIZE].tobytes()
+
+
+def expand_subkey_loop(initial_seed, algorithm_name):
+    """
+    Original byte-wise expansion loop.
+    Retained as a reference for benchmarks and output verification.
     """
     hashing_algorithm = algorithms[algorithm_name]
     expanded_key = bytearray()
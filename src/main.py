@@ -1,9 +1,12 @@
 import EnigmatrixUI
+import multiprocessing
 import sys
 
-# Run the UI
-app = EnigmatrixUI.QApplication(sys.argv)
-app.setStyle("Fusion")
-window = EnigmatrixUI.EnigmatrixApp()
-window.show()
-sys.exit(app.exec())
\ No newline at end of file
+if __name__ == "__main__":
+    # Process-pool workers re-import the main module, only the parent runs the UI
+    multiprocessing.freeze_support()
+    app = EnigmatrixUI.QApplication(sys.argv)
+    app.setStyle("Fusion")
+    window = EnigmatrixUI.EnigmatrixApp()
+    window.show()
+    sys.exit(app.exec())
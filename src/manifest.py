@@ -0,0 +1,74 @@
+"""
+Sidecar manifests of per-block plaintext digests, for delta re-encryption.
+A block's ciphertext depends only on its padded plaintext, the key and its index, so a
+block whose digest is unchanged already holds the right ciphertext and is not rewritten.
+Digests are keyed with the file key, so the manifest reveals nothing without it.
+The manifest records the size and modification time of the encrypted file it describes,
+and is ignored once the encrypted file changes in any other way.
+"""
+import hashlib
+import json
+import os
+from cfg import *
+
+MANIFEST_VERSION = 1
+
+
+def manifest_path(output_path):
+    return output_path + MANIFEST_SUFFIX
+
+
+def digest_key(plan):
+    """Block digest key of a transform plan, derived from the key's primary hash."""
+    return hashlib.blake2b(plan.primary_hash, digest_size=32, person=b"enigmatrix-blk").digest()
+
+
+def key_check(plan):
+    """Identifies the key and subkey engine a manifest was written with."""
+    check = hashlib.blake2b(plan.primary_hash, digest_size=16, person=b"enigmatrix-kcv")
+    check.update(bytes([plan.subkey_engine]))
+    return check.hexdigest()
+
+
+def block_digest(block, key):
+    """Keyed digest of a padded 1MB plaintext block. hashlib releases the GIL, so threads hash in parallel."""
+    return hashlib.blake2b(memoryview(block).cast("B"), digest_size=MANIFEST_DIGEST_SIZE, key=key).digest()
+
+
+def write_manifest(output_path, plan, size, digests):
+    """Writes the manifest of the encrypted file `output_path`, once the file itself is complete."""
+    stat = os.stat(output_path)
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "key_check": key_check(plan),
+        "size": size,
+        "encrypted_size": stat.st_size,
+        "encrypted_mtime_ns": stat.st_mtime_ns,
+        "digests": [digest.hex() for digest in digests],
+    }
+    path = manifest_path(output_path)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+
+def load_manifest(output_path, plan):
+    """
+    Returns the block digests of the encrypted file `output_path`, or None when it has no
+    manifest, the manifest was written with another key or subkey engine, or the file
+    changed since.
+    """
+    try:
+        with open(manifest_path(output_path)) as f:
+            manifest = json.load(f)
+        stat = os.stat(output_path)
+    except (OSError, ValueError):
+        return None
+    if (manifest.get("version") != MANIFEST_VERSION or manifest.get("key_check") != key_check(plan)
+            or manifest.get("encrypted_size") != stat.st_size
+            or manifest.get("encrypted_mtime_ns") != stat.st_mtime_ns):
+        return None
+    try:
+        return [bytes.fromhex(digest) for digest in manifest["digests"]]
+    except (KeyError, TypeError, ValueError):
+        return None
@@ -0,0 +1,133 @@
+"""
+Reusable encryption session for embedding Enigmatrix in Python programs.
+The key setup, the compiled transform plan and the compute threads are created once
+per session and shared by every file or buffer it processes.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+import utils
+import key_utils
+import backends
+import encryptor
+from cfg import *
+
+
+class JobStats:
+    """
+    Result of one session job: plaintext `bytes` and `blocks`, wall time in `seconds`
+    and `stages`, the seconds spent reading, computing and writing.
+    `pipeline` is the full `PipelineStats.summary()` of the run.
+    """
+    __slots__ = ("bytes", "blocks", "seconds", "stages", "pipeline")
+
+    def __init__(self, bytes, blocks, seconds, pipeline):
+        self.bytes = bytes
+        self.blocks = blocks
+        self.seconds = seconds
+        self.stages = pipeline["busy_s"]
+        self.pipeline = pipeline
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"JobStats(bytes={self.bytes}, blocks={self.blocks}, seconds={self.seconds:.3f}, stages={self.stages})"
+
+
+class Enigmatrix:
+    """
+    Encryption session for one key.
+    Built from a `raw_key` (optionally with an RSA `public_key`, so every encrypted file carries
+    the RSA-encrypted key) or from an RSA `private_key` alone, which only decrypts.
+    Keeps the primary hash, transform plan and a persistent pool of `cores` compute threads,
+    so setup is paid once per key rather than once per file. Use as a context manager, or
+    call `close` to stop the threads. The subkey cache is the process-wide shared cache.
+    """
+    def __init__(self, raw_key=None, public_key=None, private_key=None, cores=None, engine=None,
+                 subkey_engine=DEFAULT_SUBKEY_ENGINE, queue_depth=PIPELINE_QUEUE_DEPTH, direct_io=False):
+        if raw_key is None and private_key is None:
+            raise ValueError("A raw key or an RSA private key is required")
+        if subkey_engine not in key_utils.SUBKEY_ENGINES:
+            raise ValueError(f"Unknown subkey engine '{subkey_engine}'")
+        self.raw_key = raw_key
+        self.private_key = private_key
+        self.rsa_enc_key = key_utils.rsa_encrypt_key(raw_key, public_key) if public_key else None
+        self.cores = cores or utils.get_default_core_count()
+        self.backend = backends.get_backend(engine)
+        self.subkey_engine = subkey_engine
+        self.queue_depth = queue_depth
+        self.direct_io = direct_io
+        self.plan = encryptor.get_plan(raw_key, subkey_engine) if raw_key is not None else None
+        self.pool = ThreadPoolExecutor(max_workers=self.cores, thread_name_prefix="enigmatrix")
+        self.last_stats = None
+
+    def encrypt_file(self, input_path, output_path, signals=None):
+        """Encrypts a file and returns its `JobStats`."""
+        plan = self.encryption_plan()
+        start_time = time.perf_counter()
+        file_size, num_blocks, _, header_size = encryptor.prepare_encryption(input_path, output_path, self.rsa_enc_key,
+                                                                             self.subkey_engine)
+        blocks, writer = encryptor.open_encryption_files(input_path, output_path, header_size, self.direct_io)
+        with blocks, writer:
+            pipeline = encryptor.encrypt_blocks(plan, blocks, writer, self.backend, self.cores, signals,
+                                                self.queue_depth, self.pool)
+        return self.finish(file_size, num_blocks, start_time, pipeline)
+
+    def decrypt_file(self, input_path, output_path, signals=None):
+        """Decrypts a file and returns its `JobStats`."""
+        start_time = time.perf_counter()
+        header = utils.read_header(input_path)
+        plan = self.decryption_plan(header)
+        size, num_blocks = encryptor.prepare_decryption(input_path, output_path, header)
+        blocks, writer = encryptor.open_decryption_files(input_path, output_path, header, self.direct_io)
+        with blocks, writer:
+            pipeline = encryptor.decrypt_blocks(plan, blocks, writer, utils.header_last_block_size(header),
+                                                self.backend, self.cores, signals, self.queue_depth, self.pool)
+        return self.finish(size, num_blocks, start_time, pipeline)
+
+    def encrypt_bytes(self, data):
+        """Encrypts a bytes-like object in memory and returns the encrypted file contents."""
+        plan = self.encryption_plan()
+        start_time = time.perf_counter()
+        output, pipeline = encryptor.encrypt_buffer(plan, data, self.rsa_enc_key, self.backend, self.cores,
+                                                    self.queue_depth, self.pool)
+        size, num_blocks, _ = utils.size_info(memoryview(data).nbytes)
+        self.finish(size, num_blocks, start_time, pipeline)
+        return bytes(output)
+
+    def decrypt_bytes(self, data):
+        """Decrypts the contents of an encrypted file held in memory and returns the plaintext."""
+        start_time = time.perf_counter()
+        header = utils.parse_buffer_header(data)
+        output, pipeline = encryptor.decrypt_buffer(self.decryption_plan(header), data, header, self.backend,
+                                                    self.cores, self.queue_depth, self.pool)
+        size, num_blocks, _ = utils.size_info(len(output))
+        self.finish(size, num_blocks, start_time, pipeline)
+        return bytes(output)
+
+    def encryption_plan(self):
+        if self.plan is None:
+            raise ValueError("This session was created from an RSA private key and can only decrypt")
+        return self.plan
+
+    def decryption_plan(self, header):
+        """Returns the plan for a parsed header, recovering the key of RSA files with the private key."""
+        raw_key = encryptor.header_key(header, self.raw_key, self.private_key)
+        if raw_key is None:
+            raise ValueError("This file requires a raw key")
+        if self.plan is not None and raw_key == self.raw_key and header["subkey_engine"] == self.subkey_engine:
+            return self.plan
+        return encryptor.get_plan(raw_key, header["subkey_engine"])
+
+    def finish(self, size, num_blocks, start_time, pipeline):
+        self.last_stats = JobStats(size, num_blocks, time.perf_counter() - start_time, pipeline)
+        return self.last_stats
+
+    def close(self):
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,80 @@
+"""
+Bounded in-memory cache of derived subkeys, shared by every job in the process.
+A subkey depends only on the key, the subkey engine and the block index, so
+encrypt-then-verify runs, repeated benchmarks and batches of files under one key
+reuse the same subkeys instead of re-deriving them.
+"""
+import threading
+from collections import OrderedDict
+from cfg import *
+
+
+class SubkeyCache:
+    """
+    Subkey matrices keyed by `(primary_hash, subkey_engine, block_index)` within a byte budget.
+    Eviction is least recently used across keys. Within one key, entries are kept
+    first-come, so a sequential pass longer than the budget keeps its leading blocks
+    for the next pass instead of evicting every block before it is reused.
+    """
+    def __init__(self, budget=SUBKEY_CACHE_BUDGET):
+        self.budget = budget
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, primary_hash, subkey_engine, block_index):
+        """Returns the cached read-only subkey matrix, or None."""
+        key = (primary_hash, subkey_engine, block_index)
+        with self.lock:
+            matrix = self.entries.get(key)
+            if matrix is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return matrix
+
+    def put(self, primary_hash, subkey_engine, block_index, matrix):
+        """Caches a subkey matrix if it fits the budget."""
+        key = (primary_hash, subkey_engine, block_index)
+        with self.lock:
+            if key in self.entries or matrix.nbytes > self.budget:
+                return
+            while self.size + matrix.nbytes > self.budget:
+                victim_key, victim = next(iter(self.entries.items()))
+                if victim_key[:2] == key[:2]:
+                    return
+                del self.entries[victim_key]
+                self.size -= victim.nbytes
+            self.entries[key] = matrix
+            self.size += matrix.nbytes
+
+    def set_budget(self, budget):
+        """Changes the byte budget, evicting least recently used entries to fit."""
+        with self.lock:
+            self.budget = budget
+            while self.size > self.budget:
+                _, victim = self.entries.popitem(last=False)
+                self.size -= victim.nbytes
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "size_mb": round(self.size / (1024 * 1024), 2),
+                "budget_mb": round(self.budget / (1024 * 1024), 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+shared_cache = SubkeyCache()
@@ -5,6 +5,11 @@ import os
 import ctypes
 import json
 import io
+import time
+import threading
+import mmap
+import errno
+import shutil
 
 CONFIG_FILE = "./config.json"
 
@@ -79,6 +84,14 @@ def save_command(command):
     with open(CONFIG_FILE, "w") as f:
         json.dump(config, f, indent=4)
 
+def log_benchmark(config, entry):
+    """Appends a benchmark result with its engine settings to the config's benchmark log."""
+    benchmark_log = config.get("benchmark_log", [])
+    benchmark_log.append({**entry, "date": time.strftime("%Y-%m-%d %H:%M:%S")})
+    if len(benchmark_log) > BENCHMARK_LOG_LIMIT:
+        benchmark_log.pop(0)
+    config["benchmark_log"] = benchmark_log
+
 def readable_size(size_in_bytes):
     """
     Converts a file size in bytes to a human-readable format (KB, MB, GB, etc.).
@@ -98,7 +111,7 @@ def check_encrypted(file_path):
     try:
         with open(file_path, "rb") as file:
             first_byte = file.read(1)  # Read the first byte
-            return first_byte in {b"\x00", b"\x01"}  # Enigmatrix header
+            return len(first_byte) == 1 and first_byte[0] & ~HEADER_FLAGS_MASK == 0  # Enigmatrix header flags
     except: # Empty file, corrupted unreadable file
         return False
 
@@ -117,80 +130,545 @@ def estimate_encrypted_size(size_in_bytes):
     else:
         return size_in_bytes + (MB - remainder)  # Round up to the next MB
 
-def write_file_header(file_path,lcs,rsa_enc_key):
-    """Writes the encryption header to the file, including LCS and optional RSA-encrypted key."""
+def pack_header(lcs,rsa_enc_key,subkey_engine=DEFAULT_SUBKEY_ENGINE):
+    """
+    Packs the encryption header, including LCS and optional RSA-encrypted key.
+    A non-default subkey engine sets a flag bit and its ID byte follows the flags,
+    so files using the default engine keep the original header layout.
+    `lcs` None packs a streaming header: the LCS is left out and follows the blocks
+    as a `STREAM_TRAILER_SIZE` byte trailer instead.
+    """
     key_size = 0
-    rsa_flag = False
+    flags = 0
     if rsa_enc_key:
-        rsa_flag = True
+        flags |= HEADER_FLAG_RSA
         key_size = len(rsa_enc_key)
+    if subkey_engine != DEFAULT_SUBKEY_ENGINE:
+        flags |= HEADER_FLAG_SUBKEY_ENGINE
+    if lcs is None:
+        flags |= HEADER_FLAG_STREAM
+    header = struct.pack("B", flags)
+    if flags & HEADER_FLAG_SUBKEY_ENGINE:
+        header += struct.pack("B", subkey_engine)
+    # If RSA is used, write key size (4 bytes) and encrypted key
+    if flags & HEADER_FLAG_RSA:
+        header += struct.pack("I", key_size) + rsa_enc_key
+    if flags & HEADER_FLAG_STREAM:
+        return header
+    # Write Last block Size (8 bytes)
+    return header + struct.pack("Q", lcs)
+
+def pack_trailer(lcs):
+    """Packs the LCS trailer that ends a streaming format file."""
+    return struct.pack("Q", lcs)
+
+def unpack_trailer(trailer):
+    """Unpacks the LCS trailer of a streaming format file."""
+    if len(trailer) != STREAM_TRAILER_SIZE:
+        raise ValueError("Encrypted stream is truncated")
+    return struct.unpack("Q", trailer)[0]
+
+def write_last_block_size(file_path, header, num_blocks, lcs):
+    """
+    Rewrites the LCS of an encrypted file with `num_blocks` blocks and its parsed `header`:
+    in place in the header, or as the trailer after the last block in the streaming format.
+    """
+    with open(file_path, 'r+b') as f:
+        if header["stream"]:
+            f.seek(header["header_size"] + num_blocks * BLOCK_SIZE)
+            f.write(pack_trailer(lcs))
+            f.truncate()
+        else:
+            # The LCS is the last field of the header
+            f.seek(header["header_size"] - 8)
+            f.write(struct.pack("Q", lcs))
+
+def write_rsa_enc_key(file_path, header, rsa_enc_key):
+    """
+    Replaces the RSA-encrypted key of an encrypted file, with its parsed `header`, by one of
+    the same length, e.g. the same key wrapped for another public key of the same size.
+    """
+    if len(rsa_enc_key) != len(header["rsa_enc_key"]):
+        raise ValueError("The RSA-encrypted key can only be replaced by one of the same length")
+    with open(file_path, 'r+b') as f:
+        # The RSA-encrypted key is followed by the LCS, except in the streaming format
+        f.seek(header["header_size"] - (0 if header["stream"] else 8) - len(rsa_enc_key))
+        f.write(rsa_enc_key)
+
+def write_file_header(file_path,lcs,rsa_enc_key,subkey_engine=DEFAULT_SUBKEY_ENGINE):
+    """Writes the encryption header to a new file and returns the header size."""
+    header = pack_header(lcs, rsa_enc_key, subkey_engine)
     with open(file_path,'w+b') as f:
-        f.seek(0)
-        f.write(struct.pack("B", rsa_flag))
-        # If RSA is used, write key size (4 bytes) and encrypted key
-        if rsa_flag:
-            f.write(struct.pack("I", key_size))
-            f.write(rsa_enc_key)
-        # Write Last block Size (8 bytes)
-        f.write(struct.pack("Q", lcs))
+        f.write(header)
+    return len(header)
+
+def read_header(file_path):
+    """Reads and parses the encryption header into a dict, including the header size."""
+    with open(file_path, 'rb') as f:
+        header = parse_header(f)
+        if header["stream"]:
+            size = os.fstat(f.fileno()).st_size
+            f.seek(max(size - STREAM_TRAILER_SIZE, header["header_size"]))
+            header["last_block_size"] = unpack_trailer(f.read(STREAM_TRAILER_SIZE))
+    return header
+
+def parse_buffer_header(data):
+    """Parses the encryption header of an encrypted file held in memory, without copying it."""
+    view = memoryview(data).cast("B")
+    header = parse_header(io.BytesIO(view[:header_length(view)]))
+    if header["stream"]:
+        header["last_block_size"] = unpack_trailer(view[max(len(view) - STREAM_TRAILER_SIZE, header["header_size"]):])
+    return header
+
+def header_length(view):
+    """
+    Length of the header at the start of `view`, from its flags, subkey engine byte and
+    RSA key size field, so headers wrapping a key of any RSA size are read whole.
+    """
+    if not len(view):
+        raise ValueError("Encrypted header is truncated")
+    flags = view[0]
+    size = 1 + bool(flags & HEADER_FLAG_SUBKEY_ENGINE)
+    if flags & HEADER_FLAG_RSA:
+        if len(view) < size + 4:
+            raise ValueError("Encrypted header is truncated")
+        size += 4 + struct.unpack_from("I", view, size)[0]
+    return size + (0 if flags & HEADER_FLAG_STREAM else 8)
+
+def parse_header(f):
+    """
+    Parses the encryption header from a binary file object positioned at its start.
+    The streaming format has no LCS in the header, it is None until read from the trailer.
+    `trailer_size` is the number of bytes after the last block.
+    """
+    def read(size):
+        data = f.read(size)
+        if len(data) != size:
+            raise ValueError("Encrypted header is truncated")
+        return data
+
+    flags = struct.unpack("B", read(1))[0]
+    header_size = 1
+    subkey_engine = DEFAULT_SUBKEY_ENGINE
+    if flags & HEADER_FLAG_SUBKEY_ENGINE:
+        subkey_engine = struct.unpack("B", read(1))[0]
+        header_size += 1
+    rsa_enc_key = None
+    if flags & HEADER_FLAG_RSA:
+        key_size = struct.unpack("I", read(4))[0]
+        rsa_enc_key = read(key_size)
+        header_size += 4 + key_size
+    stream = bool(flags & HEADER_FLAG_STREAM)
+    lcs = None
+    if not stream:
+        lcs = struct.unpack("Q", read(8))[0]
+        header_size += 8
+    return {
+        "rsa_flag": bool(flags & HEADER_FLAG_RSA),
+        "rsa_enc_key": rsa_enc_key,
+        "last_block_size": lcs,
+        "subkey_engine": subkey_engine,
+        "header_size": header_size,
+        "stream": stream,
+        "trailer_size": STREAM_TRAILER_SIZE if stream else 0,
+    }
 
 def read_file_header(file_path):
     """Reads and parses the encryption header from the file."""
-    with open(file_path, 'rb') as f:
-        f.seek(0)
-        rsa_flag = struct.unpack("B", f.read(1))[0]
-        rsa_enc_key = None
-        if rsa_flag:
-            key_size = struct.unpack("I", f.read(4))[0]
-            rsa_enc_key = f.read(key_size)
-        lcs = struct.unpack("Q", f.read(8))[0]
-    return rsa_flag, rsa_enc_key, lcs
+    header = read_header(file_path)
+    return header["rsa_flag"], header["rsa_enc_key"], header["last_block_size"]
 
 def file_info(file_path):
     """Returns the file size, number of blocks, and last block size."""
-    file_size = os.path.getsize(file_path)
-    num_blocks = (file_size // BLOCK_SIZE) + (file_size % BLOCK_SIZE > 0)
-    last_block_size = file_size % BLOCK_SIZE
-    return file_size, num_blocks, last_block_size
+    return size_info(os.path.getsize(file_path))
+
+def size_info(size):
+    """Returns the size, number of blocks, and last block size of `size` bytes of plaintext."""
+    num_blocks = (size // BLOCK_SIZE) + (size % BLOCK_SIZE > 0)
+    last_block_size = size % BLOCK_SIZE
+    return size, num_blocks, last_block_size
 
 def calculate_num_blocks(original_size, header_size):
     """Calculates the number of blocks after adjusting for header size."""
     adjusted_size = original_size - header_size
     return (adjusted_size // BLOCK_SIZE) + (adjusted_size % BLOCK_SIZE > 0)
 
+def header_last_block_size(header):
+    """Returns the plaintext size of the last block of an encrypted file from its parsed header."""
+    # A file whose size is a multiple of 1MB stores 0 for its full last block
+    return header["last_block_size"] or BLOCK_SIZE
+
+def plaintext_size(header, num_blocks):
+    """Returns the plaintext size of an encrypted file of `num_blocks` blocks from its parsed header."""
+    return (num_blocks - 1) * BLOCK_SIZE + header_last_block_size(header) if num_blocks else 0
+
 def bytes_to_matrix(block):
     """Converts a 1MB byte block into a 1024×1024 matrix."""
     if len(block) != 1024 * 1024:
         raise ValueError("Block size must be exactly 1MB (1024*1024 bytes)")
     return np.frombuffer(block, dtype=np.uint8).reshape(1024, 1024)
 
-def matrix_to_bytes(matrix):
-    """Converts a 1024×1024 matrix back into a 1MB byte block."""
-    if matrix.shape != (1024, 1024):
-        raise ValueError("Matrix must be exactly 1024×1024 in shape")
-    return matrix.astype(np.uint8).tobytes()
-
-def truncate_block(block, original_size):
-    """Trims a block back to its original size using LCS from the header."""
-    return block[:original_size]
-
-def pad_block(block):
-    """Pads a block to ensure it is exactly 1MB by adding null bytes (0x00)."""
-    padding_length = BLOCK_SIZE - len(block)
-    return block + b'\x00' * padding_length
-
-def read_file_in_blocks(file_path, pointer=0):
-    """Reads a file in blocks and returns a generator with buffered reading."""
-    with open(file_path, "rb") as file:
-        file.seek(pointer)
-        buffered_reader = io.BufferedReader(file)
-        while block := buffered_reader.read(BLOCK_SIZE):
-            yield block
-
-def write_to_file(output_path, block):
-    """Writes processed block to a file."""
-    with open(output_path, "ab") as file:
-        file.write(block)
+def open_direct(file_path, flags):
+    """Opens `file_path` with O_DIRECT, or returns None where the platform or file system lacks it."""
+    if not hasattr(os, "O_DIRECT"):
+        return None
+    try:
+        return os.open(file_path, flags | os.O_DIRECT)
+    except OSError:
+        return None
+
+def is_aligned(block):
+    """True for a contiguous NumPy buffer that O_DIRECT can transfer as is."""
+    return (isinstance(block, np.ndarray) and block.flags.c_contiguous
+            and block.ctypes.data % BUFFER_ALIGNMENT == 0 and block.nbytes % BUFFER_ALIGNMENT == 0)
+
+class BlockReader:
+    """
+    Input file read as 1MB blocks starting at `pointer`, up to the last `trailer` bytes.
+    By default the file is memory-mapped and blocks are zero-copy memoryviews into the
+    mapping. Pages are only read when a worker touches its block, so reads are spread
+    over the workers and the data is not copied out of the page cache. Release the views
+    before `close`.
+    With `direct`, the page cache is bypassed: blocks are read into the caller's aligned
+    buffers with O_DIRECT when block offsets are aligned, otherwise read normally and
+    dropped from the page cache with POSIX_FADV_DONTNEED.
+    """
+    def __init__(self, file_path, pointer=0, direct=False, trailer=0):
+        self.file = open(file_path, "rb")
+        self.pointer = pointer
+        self.size = max(os.fstat(self.file.fileno()).st_size - pointer - trailer, 0)
+        self.num_blocks = -(-self.size // BLOCK_SIZE)
+        self.direct = direct
+        self.direct_fd = None
+        self.mm = None
+        self.lock = threading.Lock()
+        if direct:
+            if pointer % BUFFER_ALIGNMENT == 0:
+                self.direct_fd = open_direct(file_path, os.O_RDONLY)
+        elif self.size:
+            self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.view = memoryview(self.mm)
+            # Read-ahead hints, where the platform supports them
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                self.mm.madvise(mmap.MADV_SEQUENTIAL)
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(self.file.fileno(), pointer, self.size, os.POSIX_FADV_WILLNEED)
+        if self.size and hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(self.file.fileno(), pointer, self.size, os.POSIX_FADV_SEQUENTIAL)
+
+    def block_range(self, i):
+        start = self.pointer + i * BLOCK_SIZE
+        return start, min(BLOCK_SIZE, self.pointer + self.size - start)
+
+    def block(self, i):
+        start, length = self.block_range(i)
+        if self.mm is not None:
+            return self.view[start:start + length]
+        block = np.empty(length, dtype=np.uint8)
+        self.read_at(block, start)
+        return block
+
+    def read_into(self, i, out):
+        """Reads block `i` into the 1MB buffer `out`, zero-filling the padding in place."""
+        start, length = self.block_range(i)
+        flat = out.reshape(-1)
+        if self.mm is not None:
+            flat[:length] = np.frombuffer(self.view[start:start + length], dtype=np.uint8)
+        elif self.direct_fd is not None and is_aligned(flat):
+            # A whole aligned block is requested, the read stops short at the end of the file
+            os.preadv(self.direct_fd, [flat], start)
+        else:
+            self.read_at(flat[:length], start)
+            if self.direct and hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(self.file.fileno(), start, length, os.POSIX_FADV_DONTNEED)
+        flat[length:] = 0
+        return out
+
+    def read_batch(self, start, count, stack):
+        """Reads blocks `start, start + 1, ...` into a `(count, 1024, 1024)` stack and returns `count`."""
+        for n in range(count):
+            self.read_into(start + n, stack[n])
+        return count
+
+    def read_at(self, out, offset):
+        if hasattr(os, "preadv"):
+            os.preadv(self.file.fileno(), [out], offset)
+        else:
+            with self.lock:
+                self.file.seek(offset)
+                self.file.readinto(out)
+
+    def __len__(self):
+        return self.num_blocks
+
+    def __iter__(self):
+        for i in range(self.num_blocks):
+            yield self.block(i)
+
+    def close(self):
+        if self.mm is not None:
+            self.view.release()
+            self.mm.close()
+        if self.direct_fd is not None:
+            os.close(self.direct_fd)
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class BufferReader:
+    """
+    In-memory counterpart of `BlockReader`: any bytes-like object read as 1MB blocks
+    starting at `pointer` and up to the last `trailer` bytes, without copying it.
+    """
+    def __init__(self, data, pointer=0, trailer=0):
+        self.view = memoryview(data).cast("B")
+        self.pointer = pointer
+        self.size = max(len(self.view) - pointer - trailer, 0)
+        self.num_blocks = -(-self.size // BLOCK_SIZE)
+
+    def block_range(self, i):
+        start = self.pointer + i * BLOCK_SIZE
+        return start, min(BLOCK_SIZE, self.pointer + self.size - start)
+
+    def block(self, i):
+        start, length = self.block_range(i)
+        return self.view[start:start + length]
+
+    def read_into(self, i, out):
+        """Copies block `i` into the 1MB buffer `out`, zero-filling the padding in place."""
+        start, length = self.block_range(i)
+        flat = out.reshape(-1)
+        flat[:length] = np.frombuffer(self.view[start:start + length], dtype=np.uint8)
+        flat[length:] = 0
+        return out
+
+    def read_batch(self, start, count, stack):
+        """Reads blocks `start, start + 1, ...` into a `(count, 1024, 1024)` stack and returns `count`."""
+        for n in range(count):
+            self.read_into(start + n, stack[n])
+        return count
+
+    def __len__(self):
+        return self.num_blocks
+
+    def __iter__(self):
+        for i in range(self.num_blocks):
+            yield self.block(i)
+
+    def close(self):
+        self.view.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class BufferWriter:
+    """
+    In-memory counterpart of `BlockWriter`: block `i` is copied into the preallocated
+    bytearray `buffer` at `header_size + i * BLOCK_SIZE`, from any thread.
+    """
+    def __init__(self, buffer, header_size=0):
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.header_size = header_size
+
+    def write_block(self, i, block):
+        offset = self.header_size + i * BLOCK_SIZE
+        data = memoryview(block).cast("B")
+        self.view[offset:offset + len(data)] = data
+
+    def close(self):
+        self.view.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class StreamReader:
+    """
+    Unseekable binary stream, e.g. stdin, read in order as 1MB blocks of unknown count.
+    The stream is read one byte past each block, plus `trailer` bytes held back as the
+    trailer, so `num_blocks` and `trailer` are set as soon as the last block is read.
+    """
+    def __init__(self, stream, trailer=0):
+        self.stream = stream
+        self.trailer_size = trailer
+        self.trailer = None
+        self.num_blocks = None
+        self.size = 0
+        self.ahead = b""
+        self.read_ahead(0)
+
+    def read_ahead(self, i):
+        """Reads past block `i - 1`, ending the stream there if only the trailer is left."""
+        self.ahead = self.read_bytes(self.trailer_size + 1)
+        if len(self.ahead) <= self.trailer_size:
+            if len(self.ahead) != self.trailer_size:
+                raise ValueError("Encrypted stream is truncated")
+            self.trailer = self.ahead
+            self.num_blocks = i
+
+    def read_bytes(self, size):
+        data = b""
+        while len(data) < size and (chunk := self.stream.read(size - len(data))):
+            data += chunk
+        return data
+
+    def read_into(self, i, out):
+        """
+        Reads the next block, which must be block `i`, into the 1MB buffer `out` and
+        zero-fills the padding. Returns its length, 0 after the last block.
+        """
+        if self.num_blocks is not None:
+            return 0
+        flat = out.reshape(-1)
+        length = len(self.ahead)
+        flat[:length] = np.frombuffer(self.ahead, dtype=np.uint8)
+        view = memoryview(flat[length:])
+        while view and (read := self.stream.readinto(view)):
+            view = view[read:]
+            length += read
+        flat[length:] = 0
+        self.size += length
+        if length == BLOCK_SIZE:
+            self.read_ahead(i + 1)
+        elif self.trailer_size:
+            # Encrypted blocks are whole, a short one means the trailer is missing
+            raise ValueError("Encrypted stream is truncated")
+        else:
+            self.ahead = b""
+            self.num_blocks = i + 1
+        return length
+
+    def read_batch(self, start, count, stack):
+        """Reads up to `count` blocks into a `(count, 1024, 1024)` stack and returns how many were read."""
+        for n in range(count):
+            if not self.read_into(start + n, stack[n]):
+                return n
+        return count
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class StreamWriter:
+    """
+    Unseekable binary stream, e.g. stdout, written in order as blocks. Blocks must
+    arrive in index order, as `run_pipeline` writes them with `ordered=True`.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.next_block = 0
+
+    def write_block(self, i, block):
+        if i != self.next_block:
+            raise ValueError(f"Block {i} written out of order, expected block {self.next_block}")
+        self.stream.write(memoryview(block).cast("B"))
+        self.next_block += 1
+
+    def close(self):
+        self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def preallocate_file(file_path, size):
+    """
+    Reserves `size` bytes for an output file before any block is written, so a full
+    disk fails the job up front and the file is laid out in one piece. Uses
+    posix_fallocate where the platform and file system support it, otherwise checks
+    the free space and extends the file to its final size.
+    """
+    message = f"Not enough disk space for \"{file_path}\" ({readable_size(size)} needed)"
+    with open(file_path, "r+b") as f:
+        if hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+                return
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    raise OSError(message)
+                # Not supported by this file system, fall back to extending the file
+        needed = size - os.fstat(f.fileno()).st_size
+        if needed > shutil.disk_usage(os.path.dirname(os.path.abspath(file_path))).free:
+            raise OSError(message)
+        f.truncate(size)
+
+class BlockWriter:
+    """
+    Output file kept open for a whole job. Block `i` is written at its fixed offset,
+    `header_size + i * BLOCK_SIZE`, so blocks can be written in any order from any thread.
+    Accepts any buffer, e.g. a NumPy matrix, without copying it to bytes.
+    With `direct`, aligned blocks are written with O_DIRECT when block offsets are
+    aligned. Other writes are flushed and dropped from the page cache with
+    POSIX_FADV_DONTNEED every `DIRECT_IO_FLUSH_BYTES`.
+    """
+    def __init__(self, file_path, header_size=0, direct=False):
+        self.fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | getattr(os, "O_BINARY", 0))
+        self.header_size = header_size
+        # Without pwrite (Windows), seek and write must not interleave between threads
+        self.lock = None if hasattr(os, "pwrite") else threading.Lock()
+        self.direct = direct and hasattr(os, "posix_fadvise") and hasattr(os, "fdatasync")
+        self.direct_fd = None
+        if direct and header_size % BUFFER_ALIGNMENT == 0:
+            self.direct_fd = open_direct(file_path, os.O_WRONLY)
+        self.unflushed = 0
+        self.flush_lock = threading.Lock()
+
+    def write_block(self, i, block):
+        offset = self.header_size + i * BLOCK_SIZE
+        fd = self.direct_fd if self.direct_fd is not None and is_aligned(block) else self.fd
+        view = memoryview(block).cast("B")
+        length = len(view)
+        while view:
+            if self.lock is None:
+                written = os.pwrite(fd, view, offset)
+            else:
+                with self.lock:
+                    os.lseek(fd, offset, os.SEEK_SET)
+                    written = os.write(fd, view)
+            view = view[written:]
+            offset += written
+        if self.direct and fd == self.fd:
+            self.drop_cache(length)
+
+    def drop_cache(self, length=0):
+        """Writes back buffered blocks and drops them from the page cache once enough have piled up."""
+        with self.flush_lock:
+            self.unflushed += length
+            if self.unflushed and (length == 0 or self.unflushed >= DIRECT_IO_FLUSH_BYTES):
+                os.fdatasync(self.fd)
+                os.posix_fadvise(self.fd, 0, 0, os.POSIX_FADV_DONTNEED)
+                self.unflushed = 0
+
+    def close(self):
+        if self.direct:
+            self.drop_cache()
+        if self.direct_fd is not None:
+            os.close(self.direct_fd)
+        os.close(self.fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
 def generate_tree(directory, prefix="", depth=3, current_level=0):
     """Recursively generates a tree structure for the given directory up to a depth limit."""